@@ -0,0 +1,346 @@
+"""カフェ売上モックジェネレーターのベンチマーク
+
+generate_daily_sales / generate_monthly_orders と save_to_files の各出力形式を段階ごとに計測し、
+処理時間・注文数/秒・バイト数/秒・ピーク RSS を JSON で出力する。
+各段階は新しいプロセスで実行するため、ピーク RSS は段階ごとの値になる。
+"""
+
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import copy
+import cProfile
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import yaml
+
+import cafe_sales_mock_generator as cafe
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# 計測する段階（save_* は save_to_files の各出力形式）
+STAGES = ("generate_daily_sales", "generate_monthly_orders", "save_json", "save_csv", "save_excel")
+PROFILERS = ("cprofile", "tracemalloc")
+
+
+@dataclass
+class BenchmarkCase:
+    """設定の拡大率と期間の組み合わせ"""
+
+    name: str
+    stores: int = 1  # 店舗数（チェーンの店舗ごとに生成・出力し、注文数は店舗数に比例する）
+    menu: int = 1  # メニュー商品数の倍率
+    months: int = 1  # 計測する月数
+
+
+DEFAULT_CASES = [
+    BenchmarkCase("baseline"),
+    BenchmarkCase("stores_x4", stores=4),
+    BenchmarkCase("menu_x4", menu=4),
+    BenchmarkCase("months_12", months=12),
+]
+
+
+def scale_config(config: Dict[str, Any], menu: int = 1) -> Dict[str, Any]:
+    """メニュー商品数を拡大した設定を返す（元の設定は変更しない）
+
+    注文は15分枠ごとに最大1件のため、客数の設定を増やしても注文数はほとんど増えない。
+    生成量は店舗数（BenchmarkCase.stores）と月数で拡大する。
+    """
+    scaled = copy.deepcopy(config)
+    # 既存の商品を複製し、ID は既存の最大 ID より後ろに振る
+    id_step = max(item["id"] for category in scaled["menu_items"].values() for item in category["items"])
+    for category in scaled["menu_items"].values():
+        items = category["items"]
+        category["items"] = items + [
+            {**item, "id": item["id"] + id_step * copy_no, "name": f"{item['name']} {copy_no + 1}"}
+            for copy_no in range(1, menu)
+            for item in items
+        ]
+    return scaled
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    """プロセスのピーク RSS（取得できない環境では None）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KiB、macOS はバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _months(year: int, month: int, count: int) -> List[Tuple[int, int]]:
+    return [(year + (month - 1 + i) // 12, (month - 1 + i) % 12 + 1) for i in range(count)]
+
+
+def _directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _run_stage(
+    config: Dict[str, Any],
+    case: BenchmarkCase,
+    stage: str,
+    year: int,
+    month: int,
+    engine: str,
+    seed: int,
+    profile: Optional[str],
+    profile_dir: Optional[str],
+) -> Dict[str, Any]:
+    """1つの段階を実行して計測結果を返す（ワーカープロセス内で実行される）"""
+    months = _months(year, month, case.months)
+    # 拡大した設定は一度しか読まないため、キャッシュに残さない（このワーカープロセス内だけの設定）
+    os.environ["CAFE_MOCK_CONFIG_CACHE"] = "0"
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        config_path = work_dir / "config.yaml"
+        with open(config_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(scale_config(config, case.menu), f, allow_unicode=True)
+        # 1店舗なら単店舗のジェネレーター、複数ならチェーンの店舗ごとのジェネレーター
+        stores = [None] if case.stores <= 1 else [cafe.StoreProfile(i, f"店舗 {i}") for i in range(1, case.stores + 1)]
+        generators = [
+            cafe.CafeMockGenerator(str(config_path), engine=engine, seed=seed, store=store) for store in stores
+        ]
+
+        # 出力段階の入力データは計測の対象外
+        monthly_data = []
+        if stage.startswith("save_"):
+            monthly_data = [
+                (generator, y, m, generator.generate_monthly_orders(y, m))
+                for generator in generators
+                for y, m in months
+            ]
+        output_dir = work_dir / "output"
+        output_dir.mkdir()
+        os.chdir(output_dir)
+
+        baseline_rss = _peak_rss_bytes()
+        profiler = cProfile.Profile() if profile == "cprofile" else None
+        if profile == "tracemalloc":
+            tracemalloc.start()
+        if profiler:
+            profiler.enable()
+
+        started = time.perf_counter()
+        order_count, item_count = 0, 0
+        if stage == "generate_daily_sales":
+            end = datetime(*_months(year, month, case.months + 1)[-1], 1)
+            for generator in generators:
+                date = datetime(*months[0], 1)
+                while date < end:
+                    orders, order_items = generator.generate_daily_sales(date)
+                    order_count += len(orders)
+                    item_count += len(order_items)
+                    date += timedelta(days=1)
+        elif stage == "generate_monthly_orders":
+            for generator in generators:
+                for y, m in months:
+                    orders, order_items = generator.generate_monthly_orders(y, m)
+                    order_count += len(orders)
+                    item_count += len(order_items)
+        else:
+            file_format = stage[len("save_") :]
+            for generator, y, m, (orders, order_items) in monthly_data:
+                # 店舗ごとにディレクトリを分けて、同じ月のファイル名が重ならないようにする
+                store_dir = output_dir / f"store={generator.store_id:04d}"
+                store_dir.mkdir(exist_ok=True)
+                generator.save_stream(
+                    [(datetime(y, m, 1), orders, order_items)],
+                    f"{y}-{m:02d}",
+                    formats=(file_format,),
+                    table_label=f"{y}_{m:02d}",
+                    output_dir=str(store_dir),
+                )
+                order_count += len(orders)
+                item_count += len(order_items)
+        seconds = time.perf_counter() - started
+
+        if profiler:
+            profiler.disable()
+        result = {
+            "case": case.name,
+            **{key: value for key, value in asdict(case).items() if key != "name"},
+            "stage": stage,
+            "seconds": seconds,
+            "orders": order_count,
+            "order_items": item_count,
+            "orders_per_sec": order_count / seconds if seconds else None,
+            "bytes": None,
+            "bytes_per_sec": None,
+            "baseline_rss_bytes": baseline_rss,
+            "peak_rss_bytes": _peak_rss_bytes(),
+        }
+        if stage.startswith("save_"):
+            written = _directory_size(output_dir)
+            result["bytes"] = written
+            result["bytes_per_sec"] = written / seconds if seconds else None
+        os.chdir(work_dir.parent)
+
+    if profile_dir:
+        Path(profile_dir).mkdir(parents=True, exist_ok=True)
+        profile_path = Path(profile_dir) / f"{case.name}_{stage}"
+    if profiler and profile_dir:
+        profiler.dump_stats(f"{profile_path}.prof")
+    if profile == "tracemalloc":
+        snapshot = tracemalloc.take_snapshot()
+        result["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if profile_dir:
+            with open(f"{profile_path}.tracemalloc.txt", "w", encoding="utf-8") as f:
+                for stat in snapshot.statistics("lineno")[:25]:
+                    f.write(f"{stat}\n")
+    return result
+
+
+def run_benchmarks(
+    config_path: str = "config.yaml",
+    cases: Optional[List[BenchmarkCase]] = None,
+    stages: Tuple[str, ...] = STAGES,
+    year: int = 2024,
+    month: int = 1,
+    engine: str = "python",
+    seed: int = 0,
+    profile: Optional[str] = None,
+    profile_dir: Optional[str] = None,
+) -> Dict[str, Any]:
+    """各ケース・各段階を個別のプロセスで実行し、結果を JSON 互換の辞書で返す"""
+    # ケースごとに一時的な設定を作るため、設定のキャッシュは使わない
+    config = cafe.load_config(config_path, use_cache=False)
+    if profile_dir:
+        profile_dir = os.path.abspath(profile_dir)
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for case in cases or DEFAULT_CASES:
+        for stage in stages:
+            # ピーク RSS を段階ごとに測るため、毎回新しいプロセスを使う
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(
+                    _run_stage, config, case, stage, year, month, engine, seed, profile, profile_dir
+                ).result()
+            print(
+                f"{case.name:>16} {stage:<24} {result['seconds']:8.3f}s "
+                f"{result['orders_per_sec'] or 0:12.0f} orders/s",
+                file=sys.stderr,
+            )
+            results.append(result)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "engine": engine,
+            "seed": seed,
+            "start": f"{year}-{month:02d}",
+        },
+        "results": results,
+    }
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """基準の結果より注文数/秒が tolerance（割合）を超えて低下した段階を返す"""
+    baseline_rates = {(r["case"], r["stage"]): r["orders_per_sec"] for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = baseline_rates.get((result["case"], result["stage"]))
+        after = result["orders_per_sec"]
+        if before and after is not None and after < before * (1 - tolerance):
+            regressions.append(f"{result['case']}/{result['stage']}: {before:.0f} -> {after:.0f} orders/s")
+    return regressions
+
+
+def _parse_case(value: str) -> BenchmarkCase:
+    """"name:stores=4,menu=2,months=3" 形式のケース指定を解析"""
+    name, _, options = value.partition(":")
+    case = BenchmarkCase(name)
+    for option in filter(None, options.split(",")):
+        key, _, number = option.partition("=")
+        if key not in ("stores", "menu", "months"):
+            raise argparse.ArgumentTypeError(f"未対応のケース項目です: {key}")
+        setattr(case, key, int(number))
+    return case
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="カフェ売上モックジェネレーターのベンチマーク")
+    parser.add_argument("--config", default="config.yaml", help="設定ファイルのパス")
+    parser.add_argument(
+        "--case",
+        action="append",
+        type=_parse_case,
+        dest="cases",
+        help='計測ケース（例: "big:stores=4,menu=2,months=3"、複数指定可。省略時は既定の4ケース）',
+    )
+    parser.add_argument(
+        "--stages",
+        type=lambda value: tuple(value.split(",")),
+        default=STAGES,
+        help=f"計測する段階（カンマ区切り: {','.join(STAGES)}）",
+    )
+    parser.add_argument("--year", type=int, default=2024, help="計測期間の開始年")
+    parser.add_argument("--month", type=int, default=1, help="計測期間の開始月")
+    parser.add_argument("--engine", choices=cafe.CafeMockGenerator.ENGINES, default="python", help="生成エンジン")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--profile", choices=PROFILERS, help="段階ごとにプロファイルを取得")
+    parser.add_argument("--profile-dir", help="プロファイル結果（.prof / .tracemalloc.txt）の出力先")
+    parser.add_argument("--output", help="結果の JSON を書き出すパス（省略時は標準出力）")
+    parser.add_argument("--compare", help="比較する基準の結果 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="許容する注文数/秒の低下率")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"未対応の段階です: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = run_benchmarks(
+        args.config,
+        cases=args.cases,
+        stages=args.stages,
+        year=args.year,
+        month=args.month,
+        engine=args.engine,
+        seed=args.seed,
+        profile=args.profile,
+        profile_dir=args.profile_dir,
+    )
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare_results(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"性能低下: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,32 @@
-from dataclasses import dataclass
-from datetime import datetime, timedelta
+from dataclasses import dataclass, field, asdict
+from functools import lru_cache, partial
+from datetime import datetime, time, timedelta
 from enum import Enum
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator, Callable, Awaitable, TYPE_CHECKING
+import hashlib
+import inspect
+import io
+import os
+import pickle
+import shutil
+import sys
 import random
+import copy
 import json
 import csv
-import pandas as pd
-import yaml
+import numpy as np
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+from operator import attrgetter
+from contextlib import ExitStack, nullcontext
+from time import perf_counter
+import argparse
+
+
+# yaml / openpyxl / pandas / pyarrow / sqlite3 / asyncio は、起動を速くするため使う箇所で遅延インポートする
+if TYPE_CHECKING:
+    import asyncio
 
 
 class Weather(Enum):
@@ -59,6 +78,7 @@ class MenuItem:
     name: str
     price: int
     category_id: int
+    popularity: float = 1.0  # カテゴリ内で選ばれる相対的な重み
 
 
 @dataclass
@@ -71,13 +91,1593 @@ class MenuCategory:
 class TimeSlotConfig:
     hours: List[Tuple[int, int]]
     customer_range: Tuple[int, int]
+    popularity: Dict[int, float] = field(default_factory=dict)  # 商品 ID -> この時間帯での人気の倍率
+
+
+@dataclass
+class StoreProfile:
+    """チェーンモードの店舗プロファイル
+
+    menu_overrides は {"id": 商品ID, "price": 価格, "name": 名称, "popularity": 重み, "available": false} の形式で、
+    指定した項目だけを基本設定のメニューから上書きする（available: false でその店舗では販売しない）。
+    """
+
+    id: int
+    name: str
+    customer_scale: float = 1.0
+    weather_region: str = "default"
+    menu_overrides: List[Dict[str, Any]] = field(default_factory=list)
+
+    def apply(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """店舗の客数倍率とメニューの上書きを反映した設定を返す（元の設定は変更しない）"""
+        if self.customer_scale <= 0:
+            raise ValueError(f"店舗 {self.id} の customer_scale は正の値で指定してください")
+        config = copy.deepcopy(config)
+        config["max_daily_customers"] = max(1, int(config["max_daily_customers"] * self.customer_scale))
+        for slot in config["time_slots"].values():
+            slot["customer_range"] = [round(count * self.customer_scale) for count in slot["customer_range"]]
+
+        overrides = {override["id"]: override for override in self.menu_overrides}
+        dropped = set()
+        for category_name, category in config["menu_items"].items():
+            items = []
+            for item in category["items"]:
+                override = overrides.pop(item["id"], {})
+                if override.get("available", True):
+                    items.append(
+                        {**item, **{key: override[key] for key in ("name", "price", "popularity") if key in override}}
+                    )
+                else:
+                    dropped.add(item["id"])
+            if not items:
+                raise ValueError(f"店舗 {self.id} のメニューに {category_name} の商品がありません")
+            category["items"] = items
+        if overrides:
+            unknown = ", ".join(str(item_id) for item_id in overrides)
+            raise ValueError(f"店舗 {self.id} のメニュー上書きに存在しない商品 ID があります: {unknown}")
+        # 販売しない商品は時間帯の人気の倍率からも除く
+        for slot in config["time_slots"].values():
+            if slot.get("popularity"):
+                slot["popularity"] = {item_id: w for item_id, w in slot["popularity"].items() if item_id not in dropped}
+        return config
+
+
+# 解析済み設定のキャッシュ（設定ファイルの内容の SHA-256 をキーにする）
+CONFIG_CACHE_VERSION = 1
+# キャッシュに残す設定の数（これを超えたら最後に使われたのが古いものから削除する）
+CONFIG_CACHE_ENTRIES = 8
+
+
+def _config_cache_dir() -> Path:
+    """キャッシュの保存先（CAFE_MOCK_CACHE_DIR、なければ XDG_CACHE_HOME か ~/.cache の下）"""
+    if os.environ.get("CAFE_MOCK_CACHE_DIR"):
+        return Path(os.environ["CAFE_MOCK_CACHE_DIR"])
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "cafe_sales_mock_generator"
+
+
+def load_config(config_path: str, use_cache: bool = True) -> Dict[str, Any]:
+    """設定ファイルを読み込む
+
+    同じ内容の設定は2回目以降 YAML を解析せず、キャッシュした解析結果（pickle）を使う。
+    キャッシュは最近使った CONFIG_CACHE_ENTRIES 件までに保つ。
+    CAFE_MOCK_CONFIG_CACHE=0 でキャッシュを無効にできる。キャッシュに書き込めない環境では毎回解析する。
+    """
+    with open(config_path, "rb") as f:
+        data = f.read()
+    use_cache = use_cache and os.environ.get("CAFE_MOCK_CONFIG_CACHE", "1") != "0"
+    cache_path = _config_cache_dir() / f"{hashlib.sha256(data).hexdigest()}.v{CONFIG_CACHE_VERSION}.pickle"
+    if use_cache:
+        try:
+            with open(cache_path, "rb") as f:
+                config = pickle.load(f)
+            # 使った順に残すため、更新日時を最終使用日時として扱う
+            os.utime(cache_path)
+            return config
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+    import yaml
+
+    config = yaml.safe_load(data.decode("utf-8"))
+    if use_cache:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # 並行して起動したプロセスが書きかけのファイルを読まないよう、一時ファイルから置き換える
+            temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(temp_path, "wb") as f:
+                pickle.dump(config, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+            _evict_config_cache(cache_path.parent)
+        except OSError:
+            pass
+    return config
+
+
+def _evict_config_cache(directory: Path) -> None:
+    """最近使った CONFIG_CACHE_ENTRIES 件を残して古いキャッシュを削除する"""
+    entries = []
+    for path in directory.glob("*.pickle"):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except OSError:
+            # 並行して起動したプロセスが先に削除した場合
+            pass
+    entries.sort(reverse=True)
+    for _, path in entries[CONFIG_CACHE_ENTRIES:]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def config_digest(config_path: str) -> str:
+    """設定ファイルの内容の SHA-256（シャードの設定が一致しているかの確認に使う）"""
+    with open(config_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+MINUTES_PER_DAY = 24 * 60
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# 内部の日時は 1970-01-01 からの経過秒（タイムゾーンなし、datetime64[s] と同じ値）で保持する
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+
+@lru_cache(maxsize=4096)
+def _format_epoch_date(days: int) -> str:
+    return (EPOCH + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+# 注文生成の確率パラメータ（Python / NumPy 両エンジン共通）
+TICK_MINUTES = 15
+TAKEOUT_PROBABILITY = 0.2
+MAX_TAKEOUT_ITEMS = 5
+# テイクアウトで選ぶ商品のカテゴリ ID
+TAKEOUT_CATEGORIES = (1, 2, 3)
+SANDWICH_ADD_PROBABILITY = 0.35
+CAKE_ADD_PROBABILITY = 0.6
+
+# NumPy エンジンが1日あたりに消費する一様乱数のレイアウト
+# 日単位: 天気 + 時間帯ごとの客数
+_U_DAY_WEATHER = 0
+_U_DAY_CUSTOMERS = 1
+# 15分枠単位
+_U_TAKEOUT = 0
+_U_MINUTE = 1
+_U_SECOND = 2
+_U_GENDER = 3
+_U_ITEM_COUNT = 4
+_U_ADD_SANDWICH = 5
+_U_ADD_CAKE = 6
+_U_CATEGORY = 7
+_U_ITEM = _U_CATEGORY + MAX_TAKEOUT_ITEMS
+_TICK_DRAWS = _U_ITEM + MAX_TAKEOUT_ITEMS
+_DAY_DRAWS = _U_DAY_CUSTOMERS + len(TimeSlot)
+
+
+@dataclass
+class Order:
+    """1件の注文（__slots__ で属性辞書を持たない行レコード）"""
+
+    __slots__ = (
+        "store_id",
+        "date",
+        "seq",
+        "timestamp",
+        "gender_id",
+        "order_type_id",
+        "weather_id",
+        "time_slot_id",
+        "total_price",
+        "discount",
+    )
+    store_id: int  # 店舗 ID（単店舗モードは 0）
+    date: int  # 1970-01-01 からの経過日数
+    seq: int  # 日内の連番（注文 ID の NNN）
+    timestamp: int  # 1970-01-01 からの経過秒
+    gender_id: int
+    order_type_id: int
+    weather_id: int
+    time_slot_id: int
+    total_price: int
+    discount: int
+
+
+@dataclass
+class OrderItem:
+    """注文の1明細（__slots__ で属性辞書を持たない行レコード）"""
+
+    __slots__ = ("store_id", "date", "seq", "line_no", "menu_item_id", "price")
+    store_id: int
+    date: int
+    seq: int
+    line_no: int
+    menu_item_id: int
+    price: int
+
+
+def _format_order_ids(stores: np.ndarray, dates: np.ndarray, seq: np.ndarray) -> List[str]:
+    """店舗・日付・日内連番の配列から注文 ID のリストを作る（接頭辞は店舗・日ごとに1回だけ整形）
+
+    単店舗（店舗 ID 0）は YYYYMMDD-NNN、チェーンの店舗は SSSS-YYYYMMDD-NNN 形式で、店舗間でも一意になる。
+    """
+    dates = dates.astype("datetime64[D]")
+    keys = (stores.astype(np.int64) << 32) + dates.astype(np.int64)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    prefixes = [
+        f"{store:04d}-{day:%Y%m%d}-" if store else f"{day:%Y%m%d}-"
+        for store, day in zip(stores[first].tolist(), dates[first].tolist())
+    ]
+    return [prefixes[i] + f"{n:03d}" for i, n in zip(inverse.tolist(), seq.tolist())]
+
+
+def _format_item_ids(order_ids: List[str], line_no: np.ndarray) -> List[str]:
+    """注文 ID と行番号から YYYYMMDD-NNN-LL 形式の注文アイテム ID のリストを作る"""
+    return [f"{order_id}-{n:02d}" for order_id, n in zip(order_ids, line_no.tolist())]
+
+
+def _format_timestamps(timestamps: np.ndarray) -> np.ndarray:
+    """datetime64[s] の配列を "YYYY-MM-DD HH:MM:SS" 形式の文字列配列に変換"""
+    return np.char.replace(np.datetime_as_string(timestamps, unit="s"), "T", " ")
+
+
+class ColumnBatch:
+    """型付き配列で列を保持するバッチ（struct-of-arrays）の基底クラス
+
+    FIELDS に列名と dtype を定義する。行レコード（__slots__ クラス）からの構築、
+    スライス（ビューなのでコピーしない）、連結、DataFrame / Arrow への変換を提供する。
+    """
+
+    FIELDS: Dict[str, Any] = {}
+    __slots__ = ()
+
+    def __init__(self, **columns: Any):
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.asarray(columns[name], dtype=dtype))
+
+    def __len__(self) -> int:
+        return len(self.seq)
+
+    @classmethod
+    def empty(cls):
+        return cls(**{name: [] for name in cls.FIELDS})
+
+    @classmethod
+    def from_records(cls, records: List[Any]):
+        """__slots__ の行レコードのリストからバッチを作る"""
+        if not records:
+            return cls.empty()
+        # 1回の走査で全列を取り出し、int64 の2次元配列から列ごとに型を付ける
+        values = np.array(list(map(attrgetter(*cls.FIELDS), records)), dtype=np.int64)
+        return cls(**{name: values[:, i].astype(dtype) for i, (name, dtype) in enumerate(cls.FIELDS.items())})
+
+    @classmethod
+    def concat(cls, batches: List[Any]):
+        if not batches:
+            return cls.empty()
+        return cls(**{name: np.concatenate([getattr(b, name) for b in batches]) for name in cls.FIELDS})
+
+    def slice(self, start: int, stop: int):
+        return type(self)(**{name: getattr(self, name)[start:stop] for name in self.FIELDS})
+
+    def take(self, indices: np.ndarray):
+        return type(self)(**{name: getattr(self, name)[indices] for name in self.FIELDS})
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def to_dataframe(self):
+        """pandas の DataFrame に変換（数値列は配列をコピーせずに共有する）"""
+        import pandas as pd
+
+        return pd.DataFrame(self.columns(), copy=False)
+
+    def to_arrow(self):
+        """pyarrow の Table に変換（数値列は配列をコピーせずに共有する）"""
+        pa, _ = _import_pyarrow()
+        return pa.table(self.columns())
+
+
+class OrderBatch(ColumnBatch):
+    """注文の列指向バッチ（並び順は generate_daily_sales の出力順）"""
+
+    FIELDS = {
+        "store_id": np.int32,
+        "date": "datetime64[D]",
+        "seq": np.int32,
+        "timestamp": "datetime64[s]",
+        "gender_id": np.int8,
+        "order_type_id": np.int8,
+        "weather_id": np.int8,
+        "time_slot_id": np.int8,
+        "total_price": np.int32,
+        "discount": np.int32,
+    }
+    __slots__ = tuple(FIELDS)
+
+    def ids(self) -> List[str]:
+        return _format_order_ids(self.store_id, self.date, self.seq)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """従来形式（辞書のリスト、timestamp は経過秒）に変換"""
+        columns = {"id": self.ids(), "timestamp": self.timestamp.astype(np.int64).tolist()}
+        for name in ORDER_FIELDS[2:]:
+            columns[name] = getattr(self, name).tolist()
+        return [dict(zip(ORDER_FIELDS, row)) for row in zip(*(columns[name] for name in ORDER_FIELDS))]
+
+
+class OrderItemBatch(ColumnBatch):
+    """注文アイテムの列指向バッチ（並び順は生成順）"""
+
+    FIELDS = {
+        "store_id": np.int32,
+        "date": "datetime64[D]",
+        "seq": np.int32,
+        "line_no": np.int8,
+        "menu_item_id": np.int32,
+        "price": np.int32,
+    }
+    __slots__ = tuple(FIELDS)
+
+    def order_ids(self) -> List[str]:
+        return _format_order_ids(self.store_id, self.date, self.seq)
+
+    def ids(self) -> List[str]:
+        return _format_item_ids(self.order_ids(), self.line_no)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """従来形式（辞書のリスト）に変換"""
+        order_ids = self.order_ids()
+        return [
+            dict(zip(ORDER_ITEM_FIELDS, row))
+            for row in zip(
+                _format_item_ids(order_ids, self.line_no), order_ids, self.menu_item_id.tolist(), self.price.tolist()
+            )
+        ]
+
+
+# 1日分の売上データ（日付, orders, order_items）
+DailySales = Tuple[datetime, OrderBatch, OrderItemBatch]
+
+# 正規化された orders / order_items の列
+ORDER_FIELDS = ["id", "timestamp", "gender_id", "order_type_id", "weather_id", "time_slot_id", "total_price", "discount"]
+ORDER_ITEM_FIELDS = ["id", "order_id", "menu_item_id", "price"]
+
+# 名称を付与する注文の列（ID 列, 名称列の接頭辞, マスターデータのキー）
+ORDER_NAME_FIELDS = [
+    ("gender_id", "gender", "genders"),
+    ("order_type_id", "order_type", "order_types"),
+    ("weather_id", "weather", "weather_types"),
+    ("time_slot_id", "time_slot", "time_slots"),
+]
+
+# CSV 出力の列
+ORDER_CSV_FIELDS = [
+    "id",
+    "order_id",
+    "timestamp",
+    "gender_id",
+    "gender_name",
+    "order_type_id",
+    "order_type_name",
+    "weather_id",
+    "weather_name",
+    "time_slot_id",
+    "time_slot_name",
+    "total_price",
+    "discount",
+]
+
+
+# 元形式の Excel の Orders シートの列（名称列は接頭辞のみ）
+ORDER_EXCEL_FIELDS = ORDER_FIELDS + [name_field for _, name_field, _ in ORDER_NAME_FIELDS]
+
+
+def _rows(columns: Dict[str, List], fields: List[str]) -> List[Tuple]:
+    """列のリストの辞書から、fields の順に並べた行タプルのリストを作る"""
+    return list(zip(*(columns[field] for field in fields)))
+
+
+def build_alias_table(weights: List[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """重みから Walker の別名法のテーブル（確率, 別名）を作る（Vose の方法）
+
+    一様乱数 u から x = u * n の整数部 i と小数部 y を取り、y < prob[i] なら i、そうでなければ alias[i] を選ぶと
+    重みに比例した確率で添字が選ばれる。重みがすべて等しければ prob はすべて 1（常に i）になる。
+    """
+    scaled = np.asarray(weights, dtype=np.float64)
+    if not len(scaled) or (scaled < 0).any() or scaled.sum() <= 0:
+        raise ValueError(f"人気の重みは 0 以上で、合計を正にしてください: {list(weights)}")
+    scaled = scaled * len(scaled) / scaled.sum()
+    prob = np.ones(len(scaled))
+    alias = np.arange(len(scaled))
+    small = [i for i, value in enumerate(scaled) if value < 1.0]
+    large = [i for i, value in enumerate(scaled) if value >= 1.0]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        prob[less], alias[less] = scaled[less], more
+        scaled[more] += scaled[less] - 1.0
+        (small if scaled[more] < 1.0 else large).append(more)
+    # 残りは丸め誤差の分だけなので確率 1 のままにする
+    return prob, alias
+
+
+# 出力フォーマット
+# summary は生成データの集計表（SalesRollup）
+OUTPUT_FORMATS = ("json", "csv", "excel", "parquet", "arrow", "sqlite", "summary")
+COLUMNAR_FORMATS = ("parquet", "arrow")
+# 日ごとではなく列指向のバッチ（最大1ヶ月分）単位で書き出せる形式
+BATCH_FORMATS = COLUMNAR_FORMATS + ("sqlite", "summary")
+# save_to_files（月次出力）の形式
+MONTHLY_OUTPUT_FORMATS = ("json", "csv", "excel")
+
+
+# 圧縮形式と拡張子（拡張子から形式を判定する）
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz", "zstd": ".zst"}
+
+
+def _compressor(compression: str) -> Callable[[bytes], bytes]:
+    """バイト列を1つの独立したストリームに圧縮する関数（zstd は zstandard が必要なため遅延インポートする）"""
+    if compression == "gzip":
+        import gzip
+
+        # 出力を再現可能にするため、ヘッダーの更新日時は 0 に固定する
+        return partial(gzip.compress, compresslevel=6, mtime=0)
+    if compression == "bz2":
+        import bz2
+
+        return bz2.compress
+    if compression == "xz":
+        import lzma
+
+        return lzma.compress
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd 圧縮には zstandard が必要です: pip install zstandard") from e
+        # ZstdCompressor はスレッド間で共有できないため、チャンクごとに作る
+        return lambda data: zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"未対応の圧縮形式です: {compression} (選択肢: {', '.join(COMPRESSION_EXTENSIONS)})")
+
+
+def compression_from_path(path: str) -> Optional[str]:
+    """ファイル名の拡張子から圧縮形式を判定（圧縮しない場合は None）"""
+    suffix = Path(path).suffix
+    return next((name for name, extension in COMPRESSION_EXTENSIONS.items() if extension == suffix), None)
+
+
+class ParallelCompressedFile(io.RawIOBase):
+    """書き込まれたバイト列を chunk_size ごとに独立したストリームとして圧縮するファイル
+
+    gzip / bzip2 / xz / zstd はいずれも連結したストリームを1つのファイルとして展開できるため、
+    チャンクをスレッドプールで並列に圧縮し（zlib / bz2 / lzma は圧縮中に GIL を解放する）、
+    生成や書き出しと重ねる。圧縮済みのチャンクは書き込んだ順にファイルへ追記し、
+    未書き込みのチャンクは workers の2倍までに抑える。
+    チャンクは書き込みの区切りに関係なく内容の chunk_size バイトごとに切るため、
+    同じ内容なら（シャードを結合した場合も）同じ圧縮結果になる。
+    """
+
+    def __init__(self, path: str, compression: str, workers: Optional[int] = None, chunk_size: int = 4 << 20):
+        super().__init__()
+        self._compress = _compressor(compression)
+        self._file = open(path, "wb")
+        workers = workers or min(4, os.cpu_count() or 1)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compress")
+        self._max_pending = workers * 2
+        self._pending: deque = deque()
+        self._buffer = bytearray()
+        self._chunk_size = chunk_size
+        self._chunks = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        if len(self._buffer) >= self._chunk_size:
+            # chunk_size ちょうどで切り、端数は次の書き込みに持ち越す
+            full = len(self._buffer) - len(self._buffer) % self._chunk_size
+            view = memoryview(self._buffer)
+            for start in range(0, full, self._chunk_size):
+                self._submit(bytes(view[start : start + self._chunk_size]))
+            view.release()
+            del self._buffer[:full]
+        return len(data)
+
+    def _submit(self, chunk: bytes) -> None:
+        self._pending.append(self._executor.submit(self._compress, chunk))
+        self._chunks += 1
+        while len(self._pending) > self._max_pending:
+            self._file.write(self._pending.popleft().result())
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            # 空のファイルも1つのストリームとして書き出す
+            if self._buffer or not self._chunks:
+                self._submit(bytes(self._buffer))
+            while self._pending:
+                self._file.write(self._pending.popleft().result())
+        finally:
+            self._executor.shutdown()
+            self._file.close()
+            super().close()
+
+
+def open_output(path: str, newline: Optional[str] = None, compression: Optional[str] = None, binary: bool = False):
+    """出力ファイルを開く（compression を省略すると拡張子 .gz / .bz2 / .xz / .zst から判定して圧縮する）"""
+    compression = compression or compression_from_path(path)
+    if compression is None:
+        return open(path, "wb") if binary else open(path, "w", encoding="utf-8", newline=newline)
+    raw = ParallelCompressedFile(path, compression)
+    return raw if binary else io.TextIOWrapper(raw, encoding="utf-8", newline=newline, write_through=True)
+
+
+def open_input(path: str):
+    """出力ファイルをバイナリで読むために開く（圧縮されたファイルは拡張子から判定して展開する）"""
+    compression = compression_from_path(path)
+    if compression == "gzip":
+        import gzip
+
+        return gzip.open(path, "rb")
+    if compression == "bz2":
+        import bz2
+
+        return bz2.open(path, "rb")
+    if compression == "xz":
+        import lzma
+
+        return lzma.open(path, "rb")
+    if compression == "zstd":
+        import zstandard
+
+        # 連結したフレームも続けて読み、readline を使えるようにバッファを挟む
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader)
+    return open(path, "rb")
+
+
+class RecordWriter:
+    """レコードのバッチを受け取り、届いた順にファイルへ追記するライターの基底クラス
+
+    パスの拡張子が .gz / .bz2 / .xz / .zst の場合は、その形式で並列に圧縮しながら書き出す（open_output）。
+    """
+
+    def write(self, records: Iterable[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class JsonArrayWriter(RecordWriter):
+    """JSON 配列を要素ごとに追記するライター（json.dump(..., indent=2) と同じ出力）
+
+    indent=None の場合は改行・空白のないコンパクトな JSON を書き出す。
+    """
+
+    def __init__(self, path: str, indent: Optional[int] = 2):
+        self._file = open_output(path)
+        self._indent = indent
+        self._count = 0
+
+    def write(self, records: Iterable[Dict[str, Any]]) -> None:
+        if self._indent is None:
+            for record in records:
+                text = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+                self._file.write(("[" if self._count == 0 else ",") + text)
+                self._count += 1
+            return
+        padding = "\n" + " " * self._indent
+        for record in records:
+            text = json.dumps(record, ensure_ascii=False, indent=self._indent).replace("\n", padding)
+            self._file.write(("[" if self._count == 0 else ",") + padding + text)
+            self._count += 1
+
+    def close(self) -> None:
+        if not self._count:
+            self._file.write("[]")
+        else:
+            self._file.write("]" if self._indent is None else "\n]")
+        self._file.close()
+
+
+class NdjsonWriter(RecordWriter):
+    """1行1レコードの NDJSON ライター"""
+
+    def __init__(self, path: str):
+        self._file = open_output(path)
+
+    def write(self, records: Iterable[Dict[str, Any]]) -> None:
+        self._file.writelines(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records
+        )
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CsvWriter(RecordWriter):
+    """ヘッダー付き CSV をバッチ単位で追記するライター"""
+
+    def __init__(self, path: str, fieldnames: List[str]):
+        self._file = open_output(path, newline="")
+        self._fieldnames = fieldnames
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(fieldnames)
+
+    def write(self, records: Iterable[Dict[str, Any]]) -> None:
+        self.write_rows([record.get(field, "") for field in self._fieldnames] for record in records)
+
+    def write_rows(self, rows: Iterable[Tuple]) -> None:
+        """fieldnames の順に並んだ行タプルをそのまま書き出す"""
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ExcelStreamWriter:
+    """openpyxl の write-only モードでシートに行を逐次追記する Excel ライター
+
+    行は一時ファイルに書き出されるため、メモリ使用量はシートの行数に依存しない。
+    1シートの行数上限を超えた場合は「<シート名> 2」のように続きのシートを作成する。
+    """
+
+    MAX_ROWS = 1_048_576
+
+    def __init__(self, path: str):
+        self._path = path
+        from openpyxl import Workbook
+
+        self._workbook = Workbook(write_only=True)
+        self._sheets: Dict[str, Dict[str, Any]] = {}
+
+    def add_sheet(self, name: str, columns: List[str]) -> None:
+        self._sheets[name] = {"columns": columns, "part": 1}
+        self._new_worksheet(name)
+
+    def _new_worksheet(self, name: str) -> None:
+        sheet = self._sheets[name]
+        title = name if sheet["part"] == 1 else f"{name} {sheet['part']}"
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        worksheet = self._workbook.create_sheet(title)
+        header = []
+        for column in sheet["columns"]:
+            cell = WriteOnlyCell(worksheet, value=column)
+            cell.font = Font(bold=True)
+            header.append(cell)
+        worksheet.append(header)
+        sheet["worksheet"] = worksheet
+        sheet["rows"] = 1
+
+    def write(self, name: str, records: Iterable[Dict[str, Any]]) -> None:
+        columns = self._sheets[name]["columns"]
+        self.write_rows(name, ([record.get(column) for column in columns] for record in records))
+
+    def write_rows(self, name: str, rows: Iterable[Tuple]) -> None:
+        """シートの列順に並んだ行タプルをそのまま追記する"""
+        sheet = self._sheets[name]
+        for row in rows:
+            if sheet["rows"] >= self.MAX_ROWS:
+                sheet["part"] += 1
+                self._new_worksheet(name)
+            sheet["worksheet"].append(row)
+            sheet["rows"] += 1
+
+    def close(self) -> None:
+        self._workbook.save(self._path)
+
+    def __enter__(self) -> "ExcelStreamWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _import_pyarrow():
+    """pyarrow は Parquet / Arrow 出力時のみ必要なため遅延インポートする"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet / Arrow 出力には pyarrow が必要です: pip install pyarrow") from e
+    return pa, pq
+
+
+class PartitionedDatasetWriter:
+    """Arrow テーブルを Hive 形式（year=YYYY/month=M）で分割したデータセットに追記するライター
+
+    file_format は "parquet" または "arrow"（Arrow IPC ファイル）。
+    バッチは日付順に届く前提で、パーティションごとに row_group_size 行までバッファしてから
+    行グループ（レコードバッチ）として書き出す。メモリ使用量は row_group_size に比例する。
+    """
+
+    def __init__(self, root: Path, schema, file_format: str = "parquet", row_group_size: int = 65536):
+        self._pa, self._pq = _import_pyarrow()
+        self._root = root
+        self._schema = schema
+        self._file_format = file_format
+        self._row_group_size = row_group_size
+        self._partition: Optional[np.datetime64] = None
+        self._writer = None
+        self._buffer: List[Any] = []
+        self._buffered_rows = 0
+        self._parts: Dict[np.datetime64, int] = {}
+
+    def write(self, table, dates: np.ndarray) -> None:
+        """table を dates（datetime64[D]）の年月で分割して追記"""
+        months = dates.astype("datetime64[M]")
+        bounds = [0, *(np.flatnonzero(months[1:] != months[:-1]) + 1).tolist(), len(months)]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if stop > start:
+                self.append(months[start], table.slice(start, stop - start))
+
+    def append(self, month: np.datetime64, table) -> None:
+        """table（すべて month の行）を month（datetime64[M]）のパーティションに追記"""
+        if month != self._partition:
+            self._flush()
+            self._close_writer()
+            self._partition = month
+        self._buffer.append(table)
+        self._buffered_rows += table.num_rows
+        if self._buffered_rows >= self._row_group_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        if self._writer is None:
+            year, month = str(self._partition).split("-")
+            directory = self._root / f"year={year}" / f"month={int(month)}"
+            directory.mkdir(parents=True, exist_ok=True)
+            part = self._parts.get(self._partition, 0)
+            self._parts[self._partition] = part + 1
+            path = str(directory / f"part-{part}.{self._file_format}")
+            if self._file_format == "parquet":
+                self._writer = self._pq.ParquetWriter(path, self._schema)
+            else:
+                self._writer = self._pa.ipc.new_file(path, self._schema)
+        table = self._pa.concat_tables(self._buffer).combine_chunks()
+        if self._file_format == "parquet":
+            self._writer.write_table(table, row_group_size=self._row_group_size)
+        else:
+            self._writer.write_table(table, max_chunksize=self._row_group_size)
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def _close_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def close(self) -> None:
+        self._flush()
+        self._close_writer()
+
+
+class ColumnarExporter:
+    """orders / order_items / マスターテーブルを Parquet または Arrow IPC のデータセットとして書き出す
+
+    ID 列は辞書エンコードされたカテゴリ型、日時は timestamp 型で書き出す。
+    Arrow IPC はカテゴリ型のまま読み戻せるが、Parquet ではカテゴリ型は列の辞書ページになるだけで、
+    pyarrow は整数の辞書型を復元しないため int32 として読み戻される（timestamp もミリ秒精度になる）。
+    列指向のバッチ（generate_period_columns の戻り値と同じ形）をそのまま受け取る。
+    """
+
+    def __init__(
+        self,
+        root: str,
+        master_data: Dict[str, List[Dict[str, Any]]],
+        file_format: str = "parquet",
+        row_group_size: int = 65536,
+    ):
+        pa, pq = _import_pyarrow()
+        self._pa = pa
+        self._root = Path(root)
+
+        # カテゴリ型の辞書（マスターデータの ID 一覧で固定し、全バッチで共通にする）
+        master_ids = {
+            "gender_id": [g["id"] for g in master_data["genders"]],
+            "order_type_id": [ot["id"] for ot in master_data["order_types"]],
+            "weather_id": [w["id"] for w in master_data["weather_types"]],
+            "time_slot_id": [ts["id"] for ts in master_data["time_slots"]],
+            "menu_item_id": [item["id"] for item in master_data["menu_items"]],
+        }
+        self._dictionaries = {field: np.sort(np.array(ids, dtype=np.int32)) for field, ids in master_ids.items()}
+        self._category_types = {
+            field: pa.dictionary(pa.int8() if len(ids) < 128 else pa.int16(), pa.int32())
+            for field, ids in self._dictionaries.items()
+        }
+
+        self._orders_schema = pa.schema(
+            [
+                ("id", pa.string()),
+                ("timestamp", pa.timestamp("s")),
+                ("gender_id", self._category_types["gender_id"]),
+                ("order_type_id", self._category_types["order_type_id"]),
+                ("weather_id", self._category_types["weather_id"]),
+                ("time_slot_id", self._category_types["time_slot_id"]),
+                ("total_price", pa.int32()),
+                ("discount", pa.int32()),
+            ]
+        )
+        self._order_items_schema = pa.schema(
+            [
+                ("id", pa.string()),
+                ("order_id", pa.string()),
+                ("menu_item_id", self._category_types["menu_item_id"]),
+                ("price", pa.int32()),
+            ]
+        )
+
+        # マスターテーブルは分割せずに1ファイルずつ
+        master_dir = self._root / "master"
+        master_dir.mkdir(parents=True, exist_ok=True)
+        for name, rows in master_data.items():
+            table = pa.Table.from_pylist(rows)
+            path = str(master_dir / f"{name}.{file_format}")
+            if file_format == "parquet":
+                pq.write_table(table, path)
+            else:
+                with pa.ipc.new_file(path, table.schema) as writer:
+                    writer.write_table(table)
+
+        self._orders = PartitionedDatasetWriter(
+            self._root / "orders", self._orders_schema, file_format, row_group_size
+        )
+        self._order_items = PartitionedDatasetWriter(
+            self._root / "order_items", self._order_items_schema, file_format, row_group_size
+        )
+
+    def _category(self, field: str, values: np.ndarray):
+        """ID の配列を固定辞書のカテゴリ型（DictionaryArray）に変換"""
+        category_type = self._category_types[field]
+        indices = np.searchsorted(self._dictionaries[field], values)
+        return self._pa.DictionaryArray.from_arrays(
+            self._pa.array(indices, type=category_type.index_type),
+            self._pa.array(self._dictionaries[field], type=category_type.value_type),
+        )
+
+    def write(self, orders: OrderBatch, order_items: OrderItemBatch) -> None:
+        pa = self._pa
+        order_table = pa.Table.from_arrays(
+            [
+                pa.array(orders.ids(), type=pa.string()),
+                pa.array(orders.timestamp, type=pa.timestamp("s")),
+                self._category("gender_id", orders.gender_id),
+                self._category("order_type_id", orders.order_type_id),
+                self._category("weather_id", orders.weather_id),
+                self._category("time_slot_id", orders.time_slot_id),
+                pa.array(orders.total_price, type=pa.int32()),
+                pa.array(orders.discount, type=pa.int32()),
+            ],
+            schema=self._orders_schema,
+        )
+        self._orders.write(order_table, orders.date)
+
+        item_order_ids = order_items.order_ids()
+        item_ids = _format_item_ids(item_order_ids, order_items.line_no)
+        item_table = pa.Table.from_arrays(
+            [
+                pa.array(item_ids, type=pa.string()),
+                pa.array(item_order_ids, type=pa.string()),
+                self._category("menu_item_id", order_items.menu_item_id),
+                pa.array(order_items.price, type=pa.int32()),
+            ],
+            schema=self._order_items_schema,
+        )
+        self._order_items.write(item_table, order_items.date)
+
+    def append(self, name: str, month: np.datetime64, table) -> None:
+        """読み戻した orders / order_items のテーブルを month のパーティションに追記（シャードのマージ用）
+
+        Parquet から読み戻したミリ秒精度の timestamp や、ファイルごとに異なるカテゴリ型の辞書は、
+        書き出し時と同じ固定の型に変換してから追記する。
+        """
+        pa = self._pa
+        writer, schema = {
+            "orders": (self._orders, self._orders_schema),
+            "order_items": (self._order_items, self._order_items_schema),
+        }[name]
+        columns = []
+        for column in schema:
+            values = table.column(column.name)
+            if column.name in self._category_types:
+                columns.append(self._category(column.name, values.cast(pa.int32()).to_numpy()))
+            else:
+                columns.append(values.cast(column.type))
+        writer.append(month, pa.Table.from_arrays(columns, schema=schema))
+
+    def close(self) -> None:
+        self._orders.close()
+        self._order_items.close()
+
+    def __enter__(self) -> "ColumnarExporter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class DatabaseSink:
+    """正規化スキーマ（orders / order_items / マスターテーブル）で DB-API 接続に一括投入するシンク
+
+    スキーマ作成とマスターデータの投入は最初に1回だけ行い、注文は executemany でまとめて挿入する。
+    commit_rows 行ごとにコミットする大きなトランザクションで投入し、検索用インデックスは投入後の close() で
+    まとめて作成する。外部キーの参照先になる orders / order_items の id は作成時から主キーにする
+    （外部キー制約を検査する接続や、参照先に一意制約を求める DB でも投入できるように）。
+    ID・日時の列は索引を張れるよう VARCHAR にする。投入先のテーブルは空であることを前提とする。
+    """
+
+    # マスターテーブル（テーブル名, 列定義）
+    MASTER_TABLES = {
+        "categories": "id INTEGER PRIMARY KEY, name TEXT NOT NULL",
+        "menu_items": (
+            "id INTEGER PRIMARY KEY, name TEXT NOT NULL, price INTEGER NOT NULL, "
+            "category_id INTEGER NOT NULL REFERENCES categories (id)"
+        ),
+        "genders": "id INTEGER PRIMARY KEY, name TEXT NOT NULL",
+        "order_types": "id INTEGER PRIMARY KEY, name TEXT NOT NULL",
+        "weather_types": "id INTEGER PRIMARY KEY, name TEXT NOT NULL",
+        "time_slots": "id INTEGER PRIMARY KEY, name TEXT NOT NULL",
+    }
+    ORDERS_TABLE = (
+        "CREATE TABLE orders ("
+        "id VARCHAR(32) NOT NULL PRIMARY KEY, timestamp VARCHAR(19) NOT NULL, "
+        "gender_id INTEGER NOT NULL REFERENCES genders (id), "
+        "order_type_id INTEGER NOT NULL REFERENCES order_types (id), "
+        "weather_id INTEGER NOT NULL REFERENCES weather_types (id), "
+        "time_slot_id INTEGER NOT NULL REFERENCES time_slots (id), "
+        "total_price INTEGER NOT NULL, discount INTEGER NOT NULL)"
+    )
+    ORDER_ITEMS_TABLE = (
+        "CREATE TABLE order_items ("
+        "id VARCHAR(40) NOT NULL PRIMARY KEY, order_id VARCHAR(32) NOT NULL REFERENCES orders (id), "
+        "menu_item_id INTEGER NOT NULL REFERENCES menu_items (id), price INTEGER NOT NULL)"
+    )
+    # 投入後に作成する検索用インデックス
+    INDEXES = [
+        "CREATE INDEX orders_timestamp ON orders (timestamp)",
+        "CREATE INDEX order_items_order_id ON order_items (order_id)",
+        "CREATE INDEX order_items_menu_item_id ON order_items (menu_item_id)",
+    ]
+    # DB-API の paramstyle ごとの位置パラメーター
+    PLACEHOLDERS = {"qmark": "?", "format": "%s", "pyformat": "%s"}
+
+    def __init__(
+        self,
+        connection: Any,
+        master_data: Dict[str, List[Dict[str, Any]]],
+        paramstyle: str = "qmark",
+        commit_rows: int = 500_000,
+        owns_connection: bool = False,
+    ):
+        if paramstyle not in self.PLACEHOLDERS and paramstyle != "numeric":
+            raise ValueError(f"未対応の paramstyle です: {paramstyle}")
+        self._connection = connection
+        self._paramstyle = paramstyle
+        self._commit_rows = commit_rows
+        self._owns_connection = owns_connection
+        self._pending_rows = 0
+        # sqlite() で作成したファイル（失敗時に削除する）
+        self._path: Optional[Path] = None
+
+        cursor = connection.cursor()
+        for table, columns in self.MASTER_TABLES.items():
+            cursor.execute(f"CREATE TABLE {table} ({columns})")
+        cursor.execute(self.ORDERS_TABLE)
+        cursor.execute(self.ORDER_ITEMS_TABLE)
+        for table in self.MASTER_TABLES:
+            rows = master_data[table]
+            cursor.executemany(self._insert_sql(table, list(rows[0])), [tuple(row.values()) for row in rows])
+        connection.commit()
+
+        self._orders_sql = self._insert_sql("orders", ORDER_FIELDS)
+        self._order_items_sql = self._insert_sql("order_items", ORDER_ITEM_FIELDS)
+        self._cursor = cursor
+
+    @classmethod
+    def sqlite(cls, path: str, master_data: Dict[str, List[Dict[str, Any]]], **kwargs: Any) -> "DatabaseSink":
+        """SQLite ファイルを新規作成して開く（既存のファイルは置き換える）"""
+        import sqlite3
+
+        path = Path(path)
+        if path.exists():
+            path.unlink()
+        connection = sqlite3.connect(str(path))
+        # 一括投入中はジャーナルと同期書き込みを省く（途中で失敗したファイルは __exit__ で削除する）
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        try:
+            sink = cls(connection, master_data, paramstyle=sqlite3.paramstyle, owns_connection=True, **kwargs)
+        except BaseException:
+            connection.close()
+            path.unlink()
+            raise
+        sink._path = path
+        return sink
+
+    def _insert_sql(self, table: str, columns: List[str]) -> str:
+        if self._paramstyle == "numeric":
+            placeholders = ", ".join(f":{i}" for i in range(1, len(columns) + 1))
+        else:
+            placeholders = ", ".join([self.PLACEHOLDERS[self._paramstyle]] * len(columns))
+        return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    def write(self, orders: OrderBatch, order_items: OrderItemBatch) -> None:
+        """列指向のバッチを挿入"""
+        order_columns = {"id": orders.ids(), "timestamp": _format_timestamps(orders.timestamp).tolist()}
+        for name in ORDER_FIELDS[2:]:
+            order_columns[name] = getattr(orders, name).tolist()
+        item_order_ids = order_items.order_ids()
+        item_columns = {
+            "id": _format_item_ids(item_order_ids, order_items.line_no),
+            "order_id": item_order_ids,
+            "menu_item_id": order_items.menu_item_id.tolist(),
+            "price": order_items.price.tolist(),
+        }
+        self.write_rows(_rows(order_columns, ORDER_FIELDS), _rows(item_columns, ORDER_ITEM_FIELDS))
+
+    def write_rows(self, order_rows: List[Tuple], item_rows: List[Tuple]) -> None:
+        """ORDER_FIELDS / ORDER_ITEM_FIELDS の順に並んだ行タプルを挿入"""
+        self._cursor.executemany(self._orders_sql, order_rows)
+        self._cursor.executemany(self._order_items_sql, item_rows)
+        self._pending_rows += len(order_rows) + len(item_rows)
+        if self._pending_rows >= self._commit_rows:
+            self._connection.commit()
+            self._pending_rows = 0
+
+    def close(self) -> None:
+        """残りをコミットし、投入後にインデックスを作成する"""
+        self._connection.commit()
+        for statement in self.INDEXES:
+            self._cursor.execute(statement)
+        self._connection.commit()
+        self._cursor.close()
+        if self._owns_connection:
+            self._connection.close()
+
+    def __enter__(self) -> "DatabaseSink":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        if self._path is not None:
+            # ジャーナルなしでは rollback の結果が不定なため、途中まで投入したファイルごと削除する
+            self._connection.close()
+            self._path.unlink()
+            return
+        # 失敗時はインデックスを作らずに未コミット分を破棄する
+        self._connection.rollback()
+        if self._owns_connection:
+            self._connection.close()
+
+
+class SalesRollup:
+    """注文のバッチを受け取りながら集計表を逐次更新する
+
+    日次売上・時間帯別売上・商品別の販売数・天気別の売上を保持する。
+    日次の集計は日数分、その他は ID を添字とする配列で保持するため、メモリ使用量は注文数に依存しない。
+    """
+
+    def __init__(self, master_data: Dict[str, List[Dict[str, Any]]]):
+        self._master_data = master_data
+        # 日付（経過日数） -> [天気 ID, 注文数, アイテム数, 売上, 割引額, テイクアウト注文数]
+        self._daily: Dict[int, List[int]] = {}
+        slot_size = max(row["id"] for row in master_data["time_slots"]) + 1
+        self._slot_orders = np.zeros(slot_size, dtype=np.int64)
+        self._slot_revenue = np.zeros(slot_size, dtype=np.int64)
+        self._slot_discount = np.zeros(slot_size, dtype=np.int64)
+        self._slot_discounted = np.zeros(slot_size, dtype=np.int64)
+        item_size = max(row["id"] for row in master_data["menu_items"]) + 1
+        self._item_quantity = np.zeros(item_size, dtype=np.int64)
+        self._item_revenue = np.zeros(item_size, dtype=np.int64)
+
+    def update(self, orders: OrderBatch, order_items: OrderItemBatch) -> None:
+        """バッチ1つ分を集計に加える"""
+        days, day_index = np.unique(orders.date.astype(np.int64), return_inverse=True)
+        day_count = len(days)
+        order_counts = np.bincount(day_index, minlength=day_count)
+        revenue = np.bincount(day_index, weights=orders.total_price, minlength=day_count)
+        discount = np.bincount(day_index, weights=orders.discount, minlength=day_count)
+        takeout = np.bincount(
+            day_index, weights=orders.order_type_id == OrderType.TAKEOUT.value, minlength=day_count
+        )
+        weather = np.zeros(day_count, dtype=np.int64)
+        weather[day_index] = orders.weather_id
+        item_counts = dict(zip(*(a.tolist() for a in np.unique(order_items.date.astype(np.int64), return_counts=True))))
+        for i, day in enumerate(days.tolist()):
+            row = self._daily.setdefault(day, [int(weather[i]), 0, 0, 0, 0, 0])
+            row[1] += int(order_counts[i])
+            row[2] += item_counts.get(day, 0)
+            row[3] += int(revenue[i])
+            row[4] += int(discount[i])
+            row[5] += int(takeout[i])
+
+        size = len(self._slot_orders)
+        self._slot_orders += np.bincount(orders.time_slot_id, minlength=size)
+        self._slot_revenue += np.bincount(orders.time_slot_id, weights=orders.total_price, minlength=size).astype(np.int64)
+        self._slot_discount += np.bincount(orders.time_slot_id, weights=orders.discount, minlength=size).astype(np.int64)
+        self._slot_discounted += np.bincount(orders.time_slot_id, weights=orders.discount > 0, minlength=size).astype(
+            np.int64
+        )
+
+        size = len(self._item_quantity)
+        self._item_quantity += np.bincount(order_items.menu_item_id, minlength=size)
+        self._item_revenue += np.bincount(order_items.menu_item_id, weights=order_items.price, minlength=size).astype(
+            np.int64
+        )
+
+    def merge(self, other: "SalesRollup") -> None:
+        """別の期間（シャード）の集計を加える"""
+        for day, (weather_id, *counts) in other._daily.items():
+            row = self._daily.setdefault(day, [weather_id, 0, 0, 0, 0, 0])
+            row[1:] = [total + count for total, count in zip(row[1:], counts)]
+        self._slot_orders += other._slot_orders
+        self._slot_revenue += other._slot_revenue
+        self._slot_discount += other._slot_discount
+        self._slot_discounted += other._slot_discounted
+        self._item_quantity += other._item_quantity
+        self._item_revenue += other._item_revenue
+
+    @classmethod
+    def load(cls, directory: Path, master_data: Dict[str, List[Dict[str, Any]]]) -> "SalesRollup":
+        """save() で書き出した集計表の CSV から集計を復元する（平均や順位は tables() で計算し直す）"""
+        rollup = cls(master_data)
+        directory = Path(directory)
+
+        def read(name: str) -> List[Dict[str, str]]:
+            with open(directory / f"{name}.csv", "r", encoding="utf-8", newline="") as f:
+                return list(csv.DictReader(f))
+
+        daily_fields = ["weather_id", "orders", "order_items", "revenue", "discount", "takeout_orders"]
+        for row in read("daily_sales"):
+            day = datetime.strptime(row["date"], "%Y-%m-%d").toordinal() - EPOCH_ORDINAL
+            rollup._daily[day] = [int(row[field]) for field in daily_fields]
+        for row in read("time_slot_sales"):
+            slot_id = int(row["time_slot_id"])
+            rollup._slot_orders[slot_id] = int(row["orders"])
+            rollup._slot_revenue[slot_id] = int(row["revenue"])
+            rollup._slot_discount[slot_id] = int(row["discount"])
+            rollup._slot_discounted[slot_id] = int(row["discounted_orders"])
+        for row in read("item_popularity"):
+            item_id = int(row["menu_item_id"])
+            rollup._item_quantity[item_id] = int(row["quantity"])
+            rollup._item_revenue[item_id] = int(row["revenue"])
+        return rollup
+
+    def tables(self) -> Dict[str, List[Dict[str, Any]]]:
+        """集計表（テーブル名 -> 行の辞書のリスト）を返す"""
+        master = self._master_data
+        weather_names = {row["id"]: row["name"] for row in master["weather_types"]}
+        daily_sales = [
+            {
+                "date": _format_epoch_date(day),
+                "weather_id": weather_id,
+                "weather_name": weather_names.get(weather_id, "Unknown"),
+                "orders": orders,
+                "order_items": items,
+                "revenue": revenue,
+                "discount": discount,
+                "takeout_orders": takeout,
+            }
+            for day, (weather_id, orders, items, revenue, discount, takeout) in sorted(self._daily.items())
+        ]
+
+        time_slot_sales = []
+        for slot in master["time_slots"]:
+            orders = int(self._slot_orders[slot["id"]])
+            revenue = int(self._slot_revenue[slot["id"]])
+            time_slot_sales.append(
+                {
+                    "time_slot_id": slot["id"],
+                    "time_slot_name": slot["name"],
+                    "orders": orders,
+                    "revenue": revenue,
+                    "average_order_value": round(revenue / orders, 1) if orders else 0,
+                    "discounted_orders": int(self._slot_discounted[slot["id"]]),
+                    "discount": int(self._slot_discount[slot["id"]]),
+                }
+            )
+
+        items_by_quantity = sorted(
+            (
+                {
+                    "menu_item_id": item["id"],
+                    "menu_item_name": item["name"],
+                    "category_id": item["category_id"],
+                    "quantity": int(self._item_quantity[item["id"]]),
+                    "revenue": int(self._item_revenue[item["id"]]),
+                }
+                for item in master["menu_items"]
+            ),
+            key=lambda row: (-row["quantity"], row["menu_item_id"]),
+        )
+        item_popularity = [{"rank": rank, **row} for rank, row in enumerate(items_by_quantity, 1)]
+
+        weather_effects = []
+        for weather in master["weather_types"]:
+            days = [row for row in daily_sales if row["weather_id"] == weather["id"]]
+            orders = sum(row["orders"] for row in days)
+            revenue = sum(row["revenue"] for row in days)
+            weather_effects.append(
+                {
+                    "weather_id": weather["id"],
+                    "weather_name": weather["name"],
+                    "days": len(days),
+                    "orders": orders,
+                    "revenue": revenue,
+                    "orders_per_day": round(orders / len(days), 1) if days else 0,
+                    "revenue_per_day": round(revenue / len(days), 1) if days else 0,
+                    "takeout_rate": round(sum(row["takeout_orders"] for row in days) / orders, 4) if orders else 0,
+                }
+            )
+
+        return {
+            "daily_sales": daily_sales,
+            "time_slot_sales": time_slot_sales,
+            "item_popularity": item_popularity,
+            "weather_effects": weather_effects,
+        }
+
+    def save(self, directory: Path) -> None:
+        """集計表をテーブルごとの CSV として directory に書き出す"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, rows in self.tables().items():
+            fieldnames = list(rows[0]) if rows else []
+            with CsvWriter(directory / f"{name}.csv", fieldnames) as writer:
+                writer.write(rows)
+
+
+# 祝日の曜日指定（"MM-Mon#2" = MM 月の第2月曜日）に使う曜日名
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+class DemandCalendar:
+    """日付ごとの需要倍率と天気の系列を年単位で前計算して保持する需要カレンダー
+
+    設定の calendar セクションから、曜日・祝日・月（季節）・トレンドの倍率を掛け合わせた
+    需要倍率（float32）と、前日の天気に依存するマルコフ連鎖の天気（int8、Weather の値）を
+    1年分の配列として一度だけ計算し、生成時は日付から O(1) で引く。
+    天気の系列はマスターシード・地域・年から派生した乱数で各年の1月1日から進めるため、
+    期間の分割方法（ワーカー・シャード）に依らず同じになる。
+    注文は15分枠ごとに最大1件のため、需要倍率は上限（demand_ceiling）に対する割合（注文率）として使う。
+    annual_growth で上限を超える年は、トレンドが頭打ちにならないようエラーにする。
+    """
+
+    def __init__(self, config: Dict[str, Any], seed: int, region: str = "default"):
+        self._seed = seed
+        self._region = region
+        self._weekday_factors = np.array(config.get("weekday_factors", [1.0] * 7), dtype=np.float64)
+        self._monthly_factors = np.array(config.get("monthly_factors", [1.0] * 12), dtype=np.float64)
+        if self._weekday_factors.shape != (7,) or self._monthly_factors.shape != (12,):
+            raise ValueError("calendar の weekday_factors は7個（月曜始まり）、monthly_factors は12個で指定してください")
+        self._holiday_factor = config.get("holiday_factor", 1.0)
+        self._holidays = [str(holiday) for holiday in config.get("holidays", [])]
+        self._annual_growth = config.get("annual_growth", 0.0)
+        self._trend_base = datetime.strptime(str(config.get("trend_base", "2024-01-01")), "%Y-%m-%d")
+        # 注文率が 1 になる需要倍率（省略時は曜日・祝日・月の倍率の最大の積。これを超える日は 1 にそろえる）
+        default_ceiling = self._weekday_factors.max() * max(self._holiday_factor, 1.0) * self._monthly_factors.max()
+        self.ceiling = float(config.get("demand_ceiling") or default_ceiling)
+        if self.ceiling <= 0:
+            raise ValueError("calendar の demand_ceiling は正の値で指定してください")
+
+        # 天気の遷移確率（行: 前日の天気、列: 当日の天気。Weather の値の順）
+        self._transitions = None
+        if "weather_transitions" in config:
+            names = [w.name.lower() for w in Weather]
+            rows = config["weather_transitions"]
+            matrix = np.array([[rows[current].get(following, 0.0) for following in names] for current in names])
+            if not np.allclose(matrix.sum(axis=1), 1.0):
+                raise ValueError("calendar の weather_transitions は各行の合計を 1 にしてください")
+            self._transitions = np.cumsum(matrix, axis=1)
+            # 1月1日の天気は定常分布から選ぶ
+            self._initial = np.cumsum(np.linalg.matrix_power(matrix, 64)[0])
+
+        self._years: Dict[int, Tuple[np.ndarray, Optional[np.ndarray]]] = {}
+
+    @property
+    def has_weather(self) -> bool:
+        return self._transitions is not None
+
+    def prepare(self, start: datetime, end: datetime) -> None:
+        """期間にかかる年の配列を前計算する（ワーカーに渡す前に呼ぶと各ワーカーでの再計算を省ける）"""
+        for year in range(start.year, end.year + 1):
+            self._year_arrays(year)
+
+    def _year_arrays(self, year: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """1年分の需要倍率と天気の配列（1月1日からの日数を添字とする）"""
+        if year in self._years:
+            return self._years[year]
+
+        days = np.arange(np.datetime64(f"{year}-01-01"), np.datetime64(f"{year + 1}-01-01"))
+        months = days.astype("datetime64[M]").astype(np.int64) % 12
+        weekdays = (days.astype(np.int64) + 3) % 7  # 月曜日を 0 とする（1970-01-01 は木曜日）
+        demand = self._weekday_factors[weekdays] * self._monthly_factors[months]
+        holidays = self._holiday_indexes(year)
+        demand[holidays] *= self._holiday_factor
+        elapsed = days.astype(np.int64) - (self._trend_base.toordinal() - EPOCH_ORDINAL)
+        demand *= (1.0 + self._annual_growth) ** (elapsed / 365.0)
+        # トレンドで上限を超えると繁忙日が 1 にそろえられて成長が頭打ちになるため、エラーにする
+        if self._annual_growth and demand.max() > self.ceiling * (1 + 1e-9):
+            raise ValueError(
+                f"calendar の annual_growth により {year} 年の需要倍率（最大 {demand.max():.3f}）が "
+                f"demand_ceiling（{self.ceiling:.3f}）を超えます。demand_ceiling を大きくしてください"
+            )
+
+        weather = None
+        if self._transitions is not None:
+            rng = random.Random(f"weather-chain:{self._region}:{self._seed}:{year}")
+            draws = [rng.random() for _ in range(len(days))]
+            weather = np.empty(len(days), dtype=np.int8)
+            state = min(int(np.searchsorted(self._initial, draws[0], side="right")), len(Weather) - 1)
+            weather[0] = state + 1
+            for i in range(1, len(days)):
+                state = min(int(np.searchsorted(self._transitions[state], draws[i], side="right")), len(Weather) - 1)
+                weather[i] = state + 1
+
+        self._years[year] = (demand.astype(np.float32), weather)
+        return self._years[year]
+
+    def _holiday_indexes(self, year: int) -> List[int]:
+        """祝日（"YYYY-MM-DD"、毎年の "MM-DD"、曜日指定の "MM-Mon#2"）の1月1日からの日数"""
+        first = datetime(year, 1, 1)
+        indexes = []
+        for holiday in self._holidays:
+            parts = holiday.split("-")
+            if len(parts) == 3:
+                date = datetime.strptime(holiday, "%Y-%m-%d")
+                if date.year != year:
+                    continue
+            elif "#" in parts[1]:
+                weekday, nth = parts[1].split("#")
+                month_start = datetime(year, int(parts[0]), 1)
+                offset = (WEEKDAY_NAMES.index(weekday) - month_start.weekday()) % 7
+                date = month_start + timedelta(days=offset + 7 * (int(nth) - 1))
+                if date.month != month_start.month:
+                    continue
+            else:
+                try:
+                    date = datetime(year, int(parts[0]), int(parts[1]))
+                except ValueError:  # うるう年以外の 02-29
+                    continue
+            indexes.append((date - first).days)
+        return indexes
+
+    def demand(self, date: datetime) -> float:
+        """その日の需要倍率"""
+        return float(self._year_arrays(date.year)[0][date.timetuple().tm_yday - 1])
+
+    def order_rate(self, date: datetime) -> float:
+        """その日の注文率（需要倍率 / demand_ceiling、最大 1）"""
+        return min(1.0, self.demand(date) / self.ceiling)
+
+    def order_rates(self, demand: np.ndarray) -> np.ndarray:
+        """lookup の需要倍率の配列を注文率の配列に変換"""
+        return np.minimum(1.0, demand.astype(np.float64) / self.ceiling)
+
+    def weather(self, date: datetime) -> Weather:
+        """その日の天気（weather_transitions の指定時のみ）"""
+        return Weather(int(self._year_arrays(date.year)[1][date.timetuple().tm_yday - 1]))
+
+    def lookup(self, dates: List[datetime]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """複数日の需要倍率と天気（Weather の値、指定がなければ None）の配列"""
+        demand = np.empty(len(dates), dtype=np.float32)
+        weather = np.empty(len(dates), dtype=np.int8) if self.has_weather else None
+        for i, date in enumerate(dates):
+            year_demand, year_weather = self._year_arrays(date.year)
+            day = date.timetuple().tm_yday - 1
+            demand[i] = year_demand[day]
+            if weather is not None:
+                weather[i] = year_weather[day]
+        return demand, weather
+
+
+@dataclass
+class StageTiming:
+    """工程ごとの累計時間と計測回数"""
+
+    seconds: float = 0.0
+    calls: int = 0
+
+
+class _StageTimer:
+    """with ブロックの経過時間を RunMetrics の工程に加算する"""
+
+    __slots__ = ("timing", "started")
+
+    def __init__(self, timing: StageTiming):
+        self.timing = timing
+        self.started = 0.0
+
+    def __enter__(self) -> None:
+        self.started = perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.timing.seconds += perf_counter() - self.started
+        self.timing.calls += 1
+
+
+class RunMetrics:
+    """生成と書き出しの進捗・工程ごとの時間・注文数・出力バイト数を集計し、コールバックと JSON レポートで公開する
+
+    工程は生成（"generate"）と出力形式ごとの書き出し（"json" / "csv" / "excel" など）、
+    ファイルを閉じる処理（"finalize"）に分けて計測する。callback には進捗が進むたびに
+    （interval 秒に1回まで、終了時は必ず）snapshot() の辞書が渡される。
+    並列生成では生成の待ち時間を "generate" として計測する（ワーカー内の時間は含まない）。
+    """
+
+    enabled = True
+
+    def __init__(self, callback: Optional[Callable[[Dict[str, Any]], None]] = None, interval: float = 1.0):
+        self.callback = callback
+        self.interval = interval
+        self.stages: Dict[str, StageTiming] = {}
+        self.outputs: List[Path] = []
+        self.days_total = 0
+        self.days_done = 0
+        self.orders = 0
+        self.order_items = 0
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+        self._last_report = 0.0
+
+    def begin(self, days: int) -> None:
+        """days 日分の生成を予定に加える（最初の呼び出しから経過時間を測る）"""
+        if self._started is None:
+            self._started = perf_counter()
+        self.days_total += days
+
+    def stage(self, name: str) -> _StageTimer:
+        """工程 name の時間を計測するコンテキストマネージャー"""
+        timing = self.stages.get(name)
+        if timing is None:
+            timing = self.stages[name] = StageTiming()
+        return _StageTimer(timing)
+
+    def advance(self, days: int, orders: int, order_items: int) -> None:
+        """生成済みの日数・注文数・注文アイテム数を進め、必要ならコールバックを呼ぶ"""
+        self.days_done += days
+        self.orders += orders
+        self.order_items += order_items
+        if self.callback is not None and perf_counter() - self._last_report >= self.interval:
+            self._report()
+
+    def add_output(self, path: Path) -> None:
+        """出力バイト数を数えるファイル（またはディレクトリ）を登録"""
+        self.outputs.append(Path(path))
+
+    def finish(self) -> None:
+        """計測を終え、最終の進捗をコールバックに渡す"""
+        self._finished = perf_counter()
+        if self.callback is not None:
+            self._report()
+
+    def _report(self) -> None:
+        self._last_report = perf_counter()
+        self.callback(self.snapshot())
+
+    @property
+    def elapsed(self) -> float:
+        if self._started is None:
+            return 0.0
+        return (self._finished or perf_counter()) - self._started
+
+    def bytes_written(self) -> int:
+        """登録したファイルの現在のサイズの合計（書き出し中はバッファに残った分を含まない）"""
+        total = 0
+        for path in self.outputs:
+            if path.is_dir():
+                total += sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+            elif path.exists():
+                total += path.stat().st_size
+        return total
+
+    def eta(self) -> Optional[float]:
+        """生成済みの日数の割合から見積もった残り秒数（見積もれない間は None）"""
+        if self._finished is not None:
+            return 0.0
+        if not self.days_done or not self.days_total:
+            return None
+        return self.elapsed * max(self.days_total - self.days_done, 0) / self.days_done
+
+    def snapshot(self) -> Dict[str, Any]:
+        """現在の計測値を JSON に変換できる辞書で返す"""
+        elapsed = self.elapsed
+        return {
+            "elapsed_seconds": round(elapsed, 6),
+            "eta_seconds": None if self.eta() is None else round(self.eta(), 3),
+            "days_done": self.days_done,
+            "days_total": self.days_total,
+            "orders": self.orders,
+            "order_items": self.order_items,
+            "orders_per_second": round(self.orders / elapsed, 1) if elapsed else None,
+            "bytes_written": self.bytes_written(),
+            "stages": {name: asdict(timing) for name, timing in self.stages.items()},
+        }
+
+    def save(self, path: str) -> None:
+        """最終の計測値を JSON レポートとして書き出す"""
+        report = self.snapshot()
+        report["outputs"] = {
+            str(p): p.stat().st_size if p.is_file() else sum(f.stat().st_size for f in p.rglob("*") if f.is_file())
+            for p in self.outputs
+            if p.exists()
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+class NullMetrics:
+    """計測しない場合の RunMetrics の代わり（何もしないため、生成・書き出しの負荷はほぼ増えない）"""
+
+    enabled = False
+    _stage = nullcontext()
+
+    def begin(self, days: int) -> None:
+        pass
+
+    def stage(self, name: str):
+        return self._stage
+
+    def advance(self, days: int, orders: int, order_items: int) -> None:
+        pass
+
+    def add_output(self, path: Path) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+
+NULL_METRICS = NullMetrics()
 
 
 class CafeMockGenerator:
-    def __init__(self, config_path: str = "config.yaml"):
-        # Load configuration
-        with open(config_path, "r", encoding="utf-8") as f:
-            self.config = yaml.safe_load(f)
+    ENGINES = ("python", "numpy")
+
+    def __init__(
+        self,
+        config_path: str = "config.yaml",
+        engine: str = "python",
+        seed: Optional[int] = None,
+        store: Optional[StoreProfile] = None,
+        metrics: Optional[RunMetrics] = None,
+    ):
+        if engine not in self.ENGINES:
+            raise ValueError(f"未対応のエンジンです: {engine} (選択肢: {', '.join(self.ENGINES)})")
+        self.engine = engine
+
+        # マスターシード（指定時は日付ごとに独立した乱数列を派生させる）
+        self.seed = seed
+
+        # 進捗・工程ごとの時間の計測（省略時は何もしない NullMetrics）
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+
+        # Load configuration（解析済みの設定はキャッシュから読む）
+        self.config_path = config_path
+        self.config = load_config(config_path)
+
+        # チェーンモードの店舗（店舗 ID は乱数列と注文 ID に使う。単店舗は 0）
+        self.store = store
+        self.store_id = store.id if store is not None else 0
+        if store is not None:
+            self.config = store.apply(self.config)
 
         # 生成期間の設定を取得
         self.generate_year = self.config.get("generate_period", {}).get("year", 2024)
@@ -91,7 +1691,8 @@ class CafeMockGenerator:
         for category_name, category_data in self.config["menu_items"].items():
             category_id = category_data["category_id"]
             self.menu_items[category_id] = [
-                MenuItem(item["id"], item["name"], item["price"], category_id) for item in category_data["items"]
+                MenuItem(item["id"], item["name"], item["price"], category_id, item.get("popularity", 1.0))
+                for item in category_data["items"]
             ]
 
         # Business Hours
@@ -115,34 +1716,210 @@ class CafeMockGenerator:
             hours = []
             if slot_data["hours"]:
                 hours = [(h[0], h[1]) for h in slot_data["hours"]]
-            self.time_slots[slot_enum] = TimeSlotConfig(hours=hours, customer_range=tuple(slot_data["customer_range"]))
-
-    def _get_random_timestamp(self, base_time: datetime) -> datetime:
-        random_minutes = random.random() * 15
-        random_seconds = random.random() * 60
-        return base_time + timedelta(minutes=random_minutes, seconds=random_seconds)
+            self.time_slots[slot_enum] = TimeSlotConfig(
+                hours=hours,
+                customer_range=tuple(slot_data["customer_range"]),
+                popularity=slot_data.get("popularity") or {},
+            )
 
-    def _get_time_slot(self, dt: datetime) -> TimeSlot:
-        """時間帯を判定"""
-        time = dt.hour + dt.minute / 60
+        # 人気の重みによる商品・テイクアウトのカテゴリの抽選テーブル
+        self._build_popularity_tables()
+
+        # 需要カレンダー（設定に calendar がある場合のみ。天気の系列は同じ地域の店舗で共有する）
+        self.calendar = None
+        if "calendar" in self.config:
+            calendar_seed = seed if seed is not None else random.SystemRandom().getrandbits(63)
+            region = store.weather_region if store is not None else "default"
+            self.calendar = DemandCalendar(self.config["calendar"], calendar_seed, region)
+
+        # 時間帯・営業時間の参照テーブル
+        self._build_time_slot_table()
+
+        # 名称付与用の参照テーブル
+        self._build_name_lookups()
+
+        # NumPy エンジン用の参照テーブル
+        self._build_batch_tables()
+        self._np_rng = np.random.default_rng()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # 並列生成のワーカーには計測（コールバックを含む）を渡さない
+        state = self.__dict__.copy()
+        state["metrics"] = NULL_METRICS
+        return state
+
+    def _day_random(self, date: datetime) -> random.Random:
+        """マスターシード・店舗・日付から、その日専用の random.Random を派生"""
+        return random.Random((self.store_id << 96) + (self.seed << 32) + date.toordinal())
+
+    def _day_generator(self, date: datetime) -> np.random.Generator:
+        """マスターシード・店舗・日付から、その日専用の NumPy Generator を派生"""
+        if self.store_id:
+            return np.random.default_rng([date.toordinal(), self.seed, self.store_id])
+        return np.random.default_rng([date.toordinal(), self.seed])
+
+    def _shares_regional_weather(self) -> bool:
+        """同じ地域の店舗と天気を共有するか（チェーンの店舗でシード指定時のみ）"""
+        return self.store is not None and self.seed is not None
+
+    def _regional_weather_draw(self, date: datetime) -> float:
+        """地域・マスターシード・日付から天気抽選用の一様乱数を派生（両エンジン共通）"""
+        return random.Random(f"weather:{self.store.weather_region}:{self.seed}:{date.toordinal()}").random()
+
+    def _build_batch_tables(self) -> None:
+        """NumPy エンジンで使う設定値の配列を1回だけ構築"""
+        # 営業時間内の15分枠と、その時間帯・時間帯内での順番
+        self._tick_seconds = np.array([offset for offset, _ in self._ticks], dtype=np.int64)
+        self._tick_slot_ids = self.time_slot_ids(
+            np.datetime64("2000-01-01") + self._tick_seconds.astype("timedelta64[s]")
+        ).astype(np.int64)
+        self._tick_slot_rank = np.zeros(len(self._ticks), dtype=np.int64)
+        for slot_id in np.unique(self._tick_slot_ids):
+            mask = self._tick_slot_ids == slot_id
+            self._tick_slot_rank[mask] = np.arange(mask.sum())
+
+        # 天気ごと・時間帯ごとの客数範囲（列は TimeSlot の値 - 1）
+        weathers = list(Weather)
+        slot_count = len(TimeSlot)
+        self._customer_min = np.zeros((len(weathers), slot_count), dtype=np.int64)
+        self._customer_max = np.zeros((len(weathers), slot_count), dtype=np.int64)
+        for w_idx, weather in enumerate(weathers):
+            for slot, config in self.time_slots.items():
+                min_customers, max_customers = config.customer_range
+                adjusted_min = int(min_customers * self.WEATHER_FACTORS[weather])
+                adjusted_max = int(max_customers * self.WEATHER_FACTORS[weather])
+                lowest = max(1, adjusted_min)
+                self._customer_min[w_idx, slot.value - 1] = lowest
+                self._customer_max[w_idx, slot.value - 1] = max(lowest, adjusted_max)
+        self._takeout_limits = np.array(
+            [self.config["weather"][w.name.lower()]["takeout_limit"] for w in weathers], dtype=np.int64
+        )
 
+        # カテゴリごとに連結したメニュー配列（インデックス 0 は「商品なし」）
+        max_category = max(self.menu_items)
+        self._category_offset = np.zeros(max_category + 1, dtype=np.int64)
+        self._category_size = np.zeros(max_category + 1, dtype=np.int64)
+        menu_ids, menu_prices = [], []
+        for category_id in sorted(self.menu_items):
+            self._category_offset[category_id] = len(menu_ids)
+            self._category_size[category_id] = len(self.menu_items[category_id])
+            menu_ids.extend(item.id for item in self.menu_items[category_id])
+            menu_prices.extend(item.price for item in self.menu_items[category_id])
+        self._menu_ids = np.array(menu_ids, dtype=np.int64)
+        self._menu_prices = np.array(menu_prices, dtype=np.int64)
+
+        # 時間帯ごとの別名法のテーブル（行は TimeSlot の値、列はメニュー配列の位置、別名はカテゴリ内の位置）
+        self._item_prob = np.ones((slot_count + 1, len(menu_ids)))
+        self._item_alias = np.zeros((slot_count + 1, len(menu_ids)), dtype=np.int64)
+        for category_id in sorted(self.menu_items):
+            offset, size = self._category_offset[category_id], self._category_size[category_id]
+            self._item_alias[:, offset : offset + size] = np.arange(size)
+        for (slot, category_id), table in self._item_tables.items():
+            if table is not None:
+                offset, size = self._category_offset[category_id], self._category_size[category_id]
+                self._item_prob[slot.value, offset : offset + size] = table[0]
+                self._item_alias[slot.value, offset : offset + size] = table[1]
+        # テイクアウトのカテゴリの別名法のテーブル（一様なら確率 1、別名は自身）
+        category_count = len(TAKEOUT_CATEGORIES)
+        prob, alias = self._takeout_category_table or ([1.0] * category_count, list(range(category_count)))
+        self._takeout_category_ids = np.array(TAKEOUT_CATEGORIES, dtype=np.int64)
+        self._takeout_category_prob = np.array(prob)
+        self._takeout_category_alias = np.array(alias, dtype=np.int64)
+
+        # 注文種別（0: テイクアウト、それ以外: 店内の TimeSlot 値）ごとのカテゴリ構成と価格上限
+        self._kind_categories = np.zeros((slot_count + 1, MAX_TAKEOUT_ITEMS), dtype=np.int64)
+        self._kind_categories[TimeSlot.MORNING.value, :2] = [1, 2]
+        self._kind_categories[TimeSlot.LUNCH.value, :3] = [1, 2, 3]
+        self._kind_categories[TimeSlot.TEATIME.value, :2] = [1, 3]
+        self._kind_categories[TimeSlot.REGULAR.value, :3] = [1, 2, 3]
+        self._kind_price_cap = np.full(slot_count + 1, np.iinfo(np.int64).max, dtype=np.int64)
+        for slot_name, pricing in self.config["set_menu_pricing"].items():
+            self._kind_price_cap[TimeSlot[slot_name.upper()].value] = pricing["max_price"]
+
+    def _build_popularity_tables(self) -> None:
+        """商品の人気（商品の重み × 時間帯の倍率）とテイクアウトのカテゴリの重みから別名法のテーブルを1回だけ構築
+
+        重みがすべて等しい組み合わせはテーブルを持たず（None）、従来どおり一様に選ぶ。
+        """
+        menu_ids = {item.id for items in self.menu_items.values() for item in items}
+        self._item_tables: Dict[Tuple[TimeSlot, int], Optional[Tuple[List[float], List[int]]]] = {}
         for slot, config in self.time_slots.items():
+            unknown = set(config.popularity) - menu_ids
+            if unknown:
+                ids = ", ".join(str(item_id) for item_id in sorted(unknown))
+                raise ValueError(f"{slot.name.lower()} の popularity に存在しない商品 ID があります: {ids}")
+            for category_id, items in self.menu_items.items():
+                weights = [item.popularity * config.popularity.get(item.id, 1.0) for item in items]
+                prob, alias = build_alias_table(weights)
+                self._item_tables[(slot, category_id)] = (prob.tolist(), alias.tolist()) if len(set(weights)) > 1 else None
+
+        # テイクアウトのカテゴリ（ID 1〜3）の重み
+        category_weights = self.config.get("takeout_category_weights") or {}
+        weights = [category_weights.get(category_id, 1.0) for category_id in TAKEOUT_CATEGORIES]
+        prob, alias = build_alias_table(weights)
+        self._takeout_category_table = (prob.tolist(), alias.tolist()) if len(set(weights)) > 1 else None
+
+    def _pick_item(self, time_slot: TimeSlot, category_id: int, rng: random.Random) -> MenuItem:
+        """時間帯の人気の重みに従ってカテゴリ内の商品を1つ選ぶ（重みが一様なら rng.choice）"""
+        items = self.menu_items[category_id]
+        table = self._item_tables[(time_slot, category_id)]
+        if table is None:
+            return rng.choice(items)
+        prob, alias = table
+        x = rng.random() * len(items)
+        i = int(x)
+        return items[i if x - i < prob[i] else alias[i]]
+
+    def _pick_takeout_category(self, rng: random.Random) -> int:
+        """テイクアウトの商品のカテゴリを重みに従って1つ選ぶ（重みが一様なら rng.randint）"""
+        if self._takeout_category_table is None:
+            return rng.randint(TAKEOUT_CATEGORIES[0], TAKEOUT_CATEGORIES[-1])
+        prob, alias = self._takeout_category_table
+        x = rng.random() * len(TAKEOUT_CATEGORIES)
+        i = int(x)
+        return TAKEOUT_CATEGORIES[i if x - i < prob[i] else alias[i]]
+
+    def _get_random_timestamp(self, base_time: int, rng: random.Random) -> int:
+        random_minutes = rng.random() * TICK_MINUTES
+        random_seconds = rng.random() * 60
+        return int(base_time + random_minutes * 60 + random_seconds)
+
+    def _build_time_slot_table(self) -> None:
+        """1日の各分の時間帯と、営業時間内の15分枠を1回だけ計算"""
+        # 分単位の時間帯テーブル（設定で先に定義された時間帯を優先するため逆順に上書き）
+        self._minute_slot_ids = np.full(MINUTES_PER_DAY, TimeSlot.REGULAR.value, dtype=np.int8)
+        for slot, config in reversed(list(self.time_slots.items())):
             if not config.hours:  # REGULAR の場合はスキップ
                 continue
+            (start_hour, start_minute), (end_hour, end_minute) = config.hours[0], config.hours[1]
+            self._minute_slot_ids[start_hour * 60 + start_minute : end_hour * 60 + end_minute] = slot.value
+        self._minute_slots = [TimeSlot(slot_id) for slot_id in self._minute_slot_ids.tolist()]
+
+        # 営業時間と15分枠（0時からの経過秒, 時間帯）
+        self._business_start = time(*self.BUSINESS_HOURS["start"])
+        self._business_end = time(*self.BUSINESS_HOURS["end"])
+        start_minutes = self._business_start.hour * 60 + self._business_start.minute
+        end_minutes = self._business_end.hour * 60 + self._business_end.minute
+        self._ticks = [
+            (minutes * 60, self._minute_slots[minutes])
+            for minutes in range(start_minutes, end_minutes, TICK_MINUTES)
+        ]
 
-            start_hour, start_minute = config.hours[0]
-            end_hour, end_minute = config.hours[1]
-
-            start_time = start_hour + start_minute / 60
-            end_time = end_hour + end_minute / 60
-
-            if start_time <= time < end_time:
-                return slot
-
-        return TimeSlot.REGULAR
-
-    def _generate_order(self, date: datetime, order_id: int, time_slot: TimeSlot, is_takeout: bool) -> Dict[str, Any]:
-        selected_items = []
+    def _get_time_slot(self, dt: datetime) -> TimeSlot:
+        """時間帯を判定"""
+        return self._minute_slots[dt.hour * 60 + dt.minute]
+
+    def time_slot_ids(self, timestamps: np.ndarray) -> np.ndarray:
+        """datetime64 の配列に対応する時間帯 ID をまとめて判定"""
+        timestamps = np.asarray(timestamps, dtype="datetime64[m]")
+        minutes = (timestamps - timestamps.astype("datetime64[D]")).astype(np.int64)
+        return self._minute_slot_ids[minutes]
+
+    def _generate_order(
+        self, date: int, seq: int, timestamp: int, time_slot: TimeSlot, is_takeout: bool, rng: random.Random
+    ) -> Tuple[Order, List[MenuItem]]:
+        """1件の注文と選ばれた商品を生成（date は経過日数、timestamp は経過秒）"""
+        selected_items: List[MenuItem] = []
         original_total = 0
 
         # OrderType の設定
@@ -153,110 +1930,115 @@ class CafeMockGenerator:
 
         if time_slot == TimeSlot.MORNING and not is_takeout:
             # モーニングはドリンクとサンドイッチを選択
-            drink = random.choice(self.menu_items[1])
-            sandwich = random.choice(self.menu_items[2])
-            selected_items.extend(
-                [
-                    {"menu_item_id": drink.id, "price": drink.price},
-                    {"menu_item_id": sandwich.id, "price": sandwich.price},
-                ]
-            )
+            drink = self._pick_item(time_slot, 1, rng)
+            sandwich = self._pick_item(time_slot, 2, rng)
+            selected_items.extend([drink, sandwich])
             original_total = drink.price + sandwich.price
             final_price = min(set_menu_pricing["morning"]["max_price"], original_total)
 
         elif time_slot == TimeSlot.LUNCH and not is_takeout:
             # ランチタイムはドリンク、サンドイッチ、ケーキを選択
-            drink = random.choice(self.menu_items[1])
-            sandwich = random.choice(self.menu_items[2])
-            cake = random.choice(self.menu_items[3])
-            selected_items.extend(
-                [
-                    {"menu_item_id": drink.id, "price": drink.price},
-                    {"menu_item_id": sandwich.id, "price": sandwich.price},
-                    {"menu_item_id": cake.id, "price": cake.price},
-                ]
-            )
+            drink = self._pick_item(time_slot, 1, rng)
+            sandwich = self._pick_item(time_slot, 2, rng)
+            cake = self._pick_item(time_slot, 3, rng)
+            selected_items.extend([drink, sandwich, cake])
             original_total = drink.price + sandwich.price + cake.price
             final_price = min(set_menu_pricing["lunch"]["max_price"], original_total)
 
         elif time_slot == TimeSlot.TEATIME and not is_takeout:
             # ティータイムはドリンク、ケーキを選択
-            drink = random.choice(self.menu_items[1])
-            cake = random.choice(self.menu_items[3])
-            selected_items.extend(
-                [{"menu_item_id": drink.id, "price": drink.price}, {"menu_item_id": cake.id, "price": cake.price}]
-            )
+            drink = self._pick_item(time_slot, 1, rng)
+            cake = self._pick_item(time_slot, 3, rng)
+            selected_items.extend([drink, cake])
             original_total = drink.price + cake.price
             final_price = min(set_menu_pricing["teatime"]["max_price"], original_total)
 
         else:
             # 通常注文の生成
             if is_takeout:
-                num_items = random.randint(1, 5)
+                num_items = rng.randint(1, MAX_TAKEOUT_ITEMS)
                 for _ in range(num_items):
-                    category_id = random.randint(1, 3)
-                    item = random.choice(self.menu_items[category_id])
-                    selected_items.append({"menu_item_id": item.id, "price": item.price})
+                    category_id = self._pick_takeout_category(rng)
+                    item = self._pick_item(time_slot, category_id, rng)
+                    selected_items.append(item)
             else:
                 # 必ずドリンクを含める
-                drink = random.choice(self.menu_items[1])
-                selected_items.append({"menu_item_id": drink.id, "price": drink.price})
+                drink = self._pick_item(time_slot, 1, rng)
+                selected_items.append(drink)
 
                 # サンドイッチとケーキはランダムで追加
-                if random.random() < 0.35:
-                    sandwich = random.choice(self.menu_items[2])
-                    selected_items.append({"menu_item_id": sandwich.id, "price": sandwich.price})
-                if random.random() < 0.6:
-                    cake = random.choice(self.menu_items[3])
-                    selected_items.append({"menu_item_id": cake.id, "price": cake.price})
-
-            original_total = sum(item["price"] for item in selected_items)
+                if rng.random() < SANDWICH_ADD_PROBABILITY:
+                    sandwich = self._pick_item(time_slot, 2, rng)
+                    selected_items.append(sandwich)
+                if rng.random() < CAKE_ADD_PROBABILITY:
+                    cake = self._pick_item(time_slot, 3, rng)
+                    selected_items.append(cake)
+
+            original_total = sum(item.price for item in selected_items)
             final_price = original_total
 
-        order_data = {
-            "id": f"{date.strftime('%Y%m%d')}-{order_id:03d}",
-            "timestamp": date.strftime("%Y-%m-%d %H:%M:%S"),
-            "gender_id": random.choice([g.value for g in Gender]),
-            "order_type_id": order_type.value,
-            "weather_id": random.choice([w.value for w in Weather]),
-            "time_slot_id": time_slot.value,
-            "total_price": final_price,
-            "discount": max(0, original_total - final_price),
-        }
-
-        # 注文詳細を追加
-        order_data["items"] = selected_items
-
-        return order_data
+        gender_id = rng.choice([g.value for g in Gender])
+        # 天気は generate_daily_sales が1日分で上書きする（乱数列を従来と揃えるため抽選は残す）
+        weather_id = rng.choice([w.value for w in Weather])
+        order = Order(
+            store_id=self.store_id,
+            date=date,
+            seq=seq,
+            timestamp=timestamp,
+            gender_id=gender_id,
+            order_type_id=order_type.value,
+            weather_id=weather_id,
+            time_slot_id=time_slot.value,
+            total_price=final_price,
+            discount=max(0, original_total - final_price),
+        )
+        return order, selected_items
 
-    def generate_daily_sales(self, date: datetime) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    def generate_daily_sales(
+        self, date: datetime, rng: Optional[random.Random] = None
+    ) -> Tuple["OrderBatch", "OrderItemBatch"]:
         """1日の売上データを生成し、orders と order_items を返す"""
+        if rng is None:
+            rng = self._day_random(date) if self.seed is not None else random
+
         # 天気を1日の最初に1回だけ設定
-        daily_weather = random.choice([w for w in Weather])
+        daily_weather = rng.choice([w for w in Weather])
+        if self.calendar is not None and self.calendar.has_weather:
+            # 需要カレンダーの天気の系列で置き換える（乱数列をそろえるため上の抽選は残す）
+            daily_weather = self.calendar.weather(date)
+        elif self._shares_regional_weather():
+            # 地域の天気で置き換える（店舗の乱数列をそろえるため上の抽選は残す）
+            weather_index = int(self._regional_weather_draw(date) * len(Weather))
+            daily_weather = list(Weather)[min(weather_index, len(Weather) - 1)]
 
         # 変数の初期化
-        daily_orders: List[Dict[str, Any]] = []
-        daily_order_items: List[Dict[str, Any]] = []
+        daily_orders: List[Order] = []
+        daily_order_items: List[OrderItem] = []
         order_counter: int = 1
         takeout_counter: int = 0
 
         # 時間帯ごとの注文をバッファリング
-        time_slot_orders: Dict[TimeSlot, List[Dict[str, Any]]] = {slot: [] for slot in TimeSlot}
+        time_slot_orders: Dict[TimeSlot, List[Order]] = {slot: [] for slot in TimeSlot}
 
         # テイクアウトの上限設定
         weather_settings = self.config["weather"]
         takeout_limit = weather_settings[daily_weather.name.lower()]["takeout_limit"]
 
-        # 時間帯ごとの客数を計算
+        # 時間帯ごとの客数を計算（需要カレンダーの注文率を掛ける）
         customers_by_slot = {}
         total_customers = 0
+        rate = self.calendar.order_rate(date) if self.calendar is not None else None
 
         for slot, config in self.time_slots.items():
             min_customers, max_customers = config.customer_range
             adjusted_min = int(min_customers * self.WEATHER_FACTORS[daily_weather])
             adjusted_max = int(max_customers * self.WEATHER_FACTORS[daily_weather])
 
-            slot_customers = random.randint(max(1, adjusted_min), max(adjusted_min, adjusted_max))
+            lowest = max(1, adjusted_min)
+            slot_customers = rng.randint(lowest, max(lowest, adjusted_max))
+            if rate is not None:
+                # 切り捨てだと注文率 1 の日（float32 の丸めで 0.9999...）にも客数が減るため、四捨五入する
+                slot_customers = round(slot_customers * rate)
             customers_by_slot[slot] = slot_customers
             total_customers += slot_customers
 
@@ -265,89 +2047,299 @@ class CafeMockGenerator:
             factor = self.MAX_DAILY_CUSTOMERS / total_customers
             customers_by_slot = {slot: int(count * factor) for slot, count in customers_by_slot.items()}
 
-        # 営業時間内で注文を生成
-        current_time = datetime.combine(
-            date.date(),
-            datetime.strptime(
-                f"{self.BUSINESS_HOURS['start'][0]:02d}:{self.BUSINESS_HOURS['start'][1]:02d}", "%H:%M"
-            ).time(),
-        )
-        end_time = datetime.combine(
-            date.date(),
-            datetime.strptime(
-                f"{self.BUSINESS_HOURS['end'][0]:02d}:{self.BUSINESS_HOURS['end'][1]:02d}", "%H:%M"
-            ).time(),
-        )
+        # 営業時間内で注文を生成（日時は経過秒、注文 ID の日付部分は1日1回だけ整形）
+        day = date.toordinal() - EPOCH_ORDINAL
+        day_start = day * SECONDS_PER_DAY
 
         # 各時間帯の注文をバッファリング
         time_slot_orders = {slot: [] for slot in TimeSlot}
 
-        while current_time < end_time:
-            current_slot = self._get_time_slot(current_time)
+        for tick_offset, current_slot in self._ticks:
             if customers_by_slot[current_slot] > 0:
-                is_takeout = random.random() < 0.2 and takeout_counter < takeout_limit
+                # 需要カレンダーがあれば、注文率で15分枠を間引く（客数が枠数を超える時間帯にも倍率が効く）
+                if rate is not None and rng.random() >= rate:
+                    continue
+                current_time = day_start + tick_offset
+                is_takeout = rng.random() < TAKEOUT_PROBABILITY and takeout_counter < takeout_limit
                 if is_takeout:
                     takeout_counter += 1
 
                 # ランダムな時間を生成
-                random_time = self._get_random_timestamp(current_time)
-
-                order = self._generate_order(random_time, order_counter, current_slot, is_takeout)
-
-                # 注文アイテムの処理
-                order_items = []
-                for idx, item in enumerate(order["items"], 1):
-                    order_item = {
-                        "id": f"{order['id']}-{idx:02d}",
-                        "order_id": order["id"],
-                        "menu_item_id": item["menu_item_id"],
-                        "price": item["price"],
-                    }
-                    order_items.append(order_item)
-
-                # items キーを削除（normalized_ordersのため）
-                order_data = order.copy()
-                del order_data["items"]
-
-                # 1日の最初に設定した天気をオーダーに追加
-                order_data["weather_id"] = daily_weather.value
-
-                time_slot_orders[current_slot].append(order_data)
-                daily_order_items.extend(order_items)
+                random_time = self._get_random_timestamp(current_time, rng)
+
+                order, items = self._generate_order(day, order_counter, random_time, current_slot, is_takeout, rng)
+
+                # 1日の最初に設定した天気をオーダーに設定
+                order.weather_id = daily_weather.value
+
+                time_slot_orders[current_slot].append(order)
+                daily_order_items.extend(
+                    OrderItem(self.store_id, day, order_counter, line_no, item.id, item.price)
+                    for line_no, item in enumerate(items, 1)
+                )
                 order_counter += 1
                 customers_by_slot[current_slot] -= 1
 
-            current_time += timedelta(minutes=15)
-
         # 各時間帯の注文を時間でソート
         for slot in TimeSlot:
-            slot_orders = sorted(
-                time_slot_orders[slot], key=lambda x: datetime.strptime(x["timestamp"], "%Y-%m-%d %H:%M:%S")
-            )
+            slot_orders = sorted(time_slot_orders[slot], key=attrgetter("timestamp"))
             daily_orders.extend(slot_orders)
 
-        return daily_orders, daily_order_items
+        return OrderBatch.from_records(daily_orders), OrderItemBatch.from_records(daily_order_items)
+
+    def generate_period_columns(
+        self, dates: List[datetime], rng: Optional[np.random.Generator] = None
+    ) -> Tuple["OrderBatch", "OrderItemBatch"]:
+        """複数日分の売上データを NumPy でまとめて生成し、列指向のバッチで返す"""
+        tick_shape = (len(self._tick_seconds), _TICK_DRAWS)
+        # 需要カレンダーの注文率で15分枠を間引くための乱数（カレンダーがなければ引かない）
+        rate_shape = (len(self._tick_seconds),) if self.calendar is not None else None
+        rate_draws = None
+        if rng is None and self.seed is not None:
+            # 日付ごとの乱数列から同じ形の乱数ブロックを引くので、分割方法に依らず結果が一致する
+            day_draws = np.empty((len(dates), _DAY_DRAWS))
+            tick_draws = np.empty((len(dates),) + tick_shape)
+            if rate_shape:
+                rate_draws = np.empty((len(dates),) + rate_shape)
+            for i, date in enumerate(dates):
+                day_rng = self._day_generator(date)
+                day_draws[i] = day_rng.random(_DAY_DRAWS)
+                tick_draws[i] = day_rng.random(tick_shape)
+                if rate_shape:
+                    rate_draws[i] = day_rng.random(rate_shape)
+            if self._shares_regional_weather():
+                day_draws[:, _U_DAY_WEATHER] = [self._regional_weather_draw(date) for date in dates]
+        else:
+            rng = rng if rng is not None else self._np_rng
+            day_draws = rng.random((len(dates), _DAY_DRAWS))
+            tick_draws = rng.random((len(dates),) + tick_shape)
+            if rate_shape:
+                rate_draws = rng.random((len(dates),) + rate_shape)
+        return self._columns_from_draws(dates, day_draws, tick_draws, rate_draws)
+
+    def generate_daily_columns(
+        self, date: datetime, rng: Optional[np.random.Generator] = None
+    ) -> Tuple["OrderBatch", "OrderItemBatch"]:
+        """1日分の売上データを NumPy で生成し、列指向のバッチで返す"""
+        return self.generate_period_columns([date], rng)
+
+    def _columns_from_draws(
+        self,
+        dates: List[datetime],
+        day_draws: np.ndarray,
+        tick_draws: np.ndarray,
+        rate_draws: Optional[np.ndarray] = None,
+    ) -> Tuple["OrderBatch", "OrderItemBatch"]:
+        """一様乱数の配列から orders / order_items の列を組み立てる（generate_daily_sales と同じ分布）"""
+        # 天気と時間帯ごとの客数（需要カレンダーがあれば天気の系列と注文率を使う）
+        demand, calendar_weather = self.calendar.lookup(dates) if self.calendar is not None else (None, None)
+        weather_idx = np.minimum((day_draws[:, _U_DAY_WEATHER] * len(Weather)).astype(np.int64), len(Weather) - 1)
+        if calendar_weather is not None:
+            weather_idx = calendar_weather.astype(np.int64) - 1
+        customer_min = self._customer_min[weather_idx]
+        customer_max = self._customer_max[weather_idx]
+        slot_draws = day_draws[:, _U_DAY_CUSTOMERS:_DAY_DRAWS]
+        customers = customer_min + (slot_draws * (customer_max - customer_min + 1)).astype(np.int64)
+        rate = self.calendar.order_rates(demand) if demand is not None else None
+        if rate is not None:
+            customers = np.rint(customers * rate[:, None]).astype(np.int64)
 
-    def generate_monthly_orders(self, year: int, month: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-        """1ヶ月分の売上データを生成"""
-        monthly_orders = []
-        monthly_order_items = []
-        current_date = datetime(year, month, 1)
+        # 最大客数の制限
+        total_customers = customers.sum(axis=1)
+        over = total_customers > self.MAX_DAILY_CUSTOMERS
+        factor = self.MAX_DAILY_CUSTOMERS / total_customers[over]
+        customers[over] = (customers[over] * factor[:, None]).astype(np.int64)
+
+        # 15分枠ごとに、その時間帯の客数が残っていれば1件の注文
+        tick_customers = customers[:, self._tick_slot_ids - 1]
+        if rate is None:
+            has_order = self._tick_slot_rank[None, :] < tick_customers
+        else:
+            # 注文率で間引いて残った枠に、時間帯ごとに先頭から客数まで注文を割り当てる
+            kept = rate_draws < rate[:, None]
+            kept_rank = np.zeros(kept.shape, dtype=np.int64)
+            for slot in TimeSlot:
+                in_slot = kept & (self._tick_slot_ids == slot.value)[None, :]
+                kept_rank += np.where(in_slot, np.cumsum(in_slot, axis=1), 0)
+            has_order = kept & (kept_rank <= tick_customers)
+        takeout_candidate = has_order & (tick_draws[:, :, _U_TAKEOUT] < TAKEOUT_PROBABILITY)
+        takeout_limit = self._takeout_limits[weather_idx][:, None]
+        is_takeout_grid = takeout_candidate & (np.cumsum(takeout_candidate, axis=1) <= takeout_limit)
+
+        day_idx, tick_idx = np.nonzero(has_order)
+        draws = tick_draws[day_idx, tick_idx]
+        seq = np.cumsum(has_order, axis=1)[day_idx, tick_idx]
+        is_takeout = is_takeout_grid[day_idx, tick_idx]
+        slot_ids = self._tick_slot_ids[tick_idx]
+
+        # 注文日時（ベース時刻 + 0〜15分 + 0〜60秒、秒未満は切り捨て）
+        offsets = (draws[:, _U_MINUTE] * TICK_MINUTES * 60 + draws[:, _U_SECOND] * 60).astype(np.int64)
+        day_values = np.array([d.date() for d in dates], dtype="datetime64[D]")
+        order_dates = day_values[day_idx]
+        timestamps = order_dates.astype("datetime64[s]") + (self._tick_seconds[tick_idx] + offsets)
+
+        # 商品カテゴリの構成（テイクアウトは種別 0、店内は時間帯ごとのセット/通常注文）
+        kind = np.where(is_takeout, 0, slot_ids)
+        categories = self._kind_categories[kind]
+        regular = kind == TimeSlot.REGULAR.value
+        categories[regular, 1] = np.where(draws[regular, _U_ADD_SANDWICH] < SANDWICH_ADD_PROBABILITY, 2, 0)
+        categories[regular, 2] = np.where(draws[regular, _U_ADD_CAKE] < CAKE_ADD_PROBABILITY, 3, 0)
+        takeout_draws = draws[is_takeout]
+        num_items = 1 + (takeout_draws[:, _U_ITEM_COUNT] * MAX_TAKEOUT_ITEMS).astype(np.int64)
+        # テイクアウトのカテゴリは重みに従って選ぶ（別名法。重みが一様なら確率 1 で常に x の整数部）
+        x = takeout_draws[:, _U_CATEGORY:_U_ITEM] * len(TAKEOUT_CATEGORIES)
+        index = x.astype(np.int64)
+        index = np.where(x - index < self._takeout_category_prob[index], index, self._takeout_category_alias[index])
+        takeout_categories = self._takeout_category_ids[index]
+        categories[is_takeout] = np.where(
+            np.arange(MAX_TAKEOUT_ITEMS)[None, :] < num_items[:, None], takeout_categories, 0
+        )
 
-        while current_date.month == month:
-            daily_orders, daily_order_items = self.generate_daily_sales(current_date)
-            monthly_orders.extend(daily_orders)
-            monthly_order_items.extend(daily_order_items)
-            current_date += timedelta(days=1)
+        # カテゴリ内で時間帯の人気の重みに従って商品を選択（別名法）
+        has_item = categories > 0
+        offsets = self._category_offset[categories]
+        x = draws[:, _U_ITEM:_TICK_DRAWS] * self._category_size[categories]
+        index = x.astype(np.int64)
+        slot_rows = slot_ids[:, None]
+        keep = x - index < self._item_prob[slot_rows, offsets + index]
+        positions = offsets + np.where(keep, index, self._item_alias[slot_rows, offsets + index])
+        positions = np.where(has_item, positions, 0)
+        item_prices = np.where(has_item, self._menu_prices[positions], 0)
+        original_total = item_prices.sum(axis=1)
+        final_price = np.minimum(original_total, self._kind_price_cap[kind])
+
+        # 時間帯順・時刻順に並べ替え（generate_daily_sales と同じ順序）
+        order_sort = np.lexsort((timestamps, slot_ids, day_idx))
+        orders = OrderBatch(
+            store_id=np.full(len(order_sort), self.store_id),
+            date=order_dates[order_sort],
+            seq=seq[order_sort],
+            timestamp=timestamps[order_sort],
+            gender_id=(1 + (draws[:, _U_GENDER] * len(Gender)).astype(np.int64))[order_sort],
+            order_type_id=np.where(is_takeout, OrderType.TAKEOUT.value, OrderType.FOR_HERE.value)[order_sort],
+            weather_id=(weather_idx + 1)[day_idx][order_sort],
+            time_slot_id=slot_ids[order_sort],
+            total_price=final_price[order_sort],
+            discount=(original_total - final_price)[order_sort],
+        )
 
-        return monthly_orders, monthly_order_items
+        # 注文アイテムは生成順のまま
+        order_row, item_col = np.nonzero(has_item)
+        order_items = OrderItemBatch(
+            store_id=np.full(len(order_row), self.store_id),
+            date=order_dates[order_row],
+            seq=seq[order_row],
+            line_no=np.cumsum(has_item, axis=1)[order_row, item_col],
+            menu_item_id=self._menu_ids[positions[order_row, item_col]],
+            price=item_prices[order_row, item_col],
+        )
+        return orders, order_items
+
+    def _generate_days(self, dates: List[datetime]) -> List[DailySales]:
+        """連続した日付の売上データを選択中のエンジンで生成し、日ごとに返す"""
+        if self.engine != "numpy":
+            return [(date, *self.generate_daily_sales(date)) for date in dates]
+
+        orders, order_items = self.generate_period_columns(dates)
+
+        # 列は日付順に並んでいるので、日付の境界で分割する
+        day_values = np.array([d.date() for d in dates], dtype="datetime64[D]")
+        order_bounds = [0, *np.searchsorted(orders.date, day_values[1:]).tolist(), len(orders)]
+        item_bounds = [0, *np.searchsorted(order_items.date, day_values[1:]).tolist(), len(order_items)]
+        return [
+            (
+                date,
+                orders.slice(order_bounds[i], order_bounds[i + 1]),
+                order_items.slice(item_bounds[i], item_bounds[i + 1]),
+            )
+            for i, date in enumerate(dates)
+        ]
 
-    def save_to_files(self, order_data: Tuple[List[Dict[str, Any]], List[Dict[str, Any]]], year: int, month: int):
-        """データを各形式で保存 - 正規化されたスキーマで保存"""
-        orders, order_items = order_data
+    def _generate_columns(self, dates: List[datetime]) -> Tuple["OrderBatch", "OrderItemBatch"]:
+        """連続した日付の売上データを列指向のバッチとして生成"""
+        if self.engine == "numpy":
+            return self.generate_period_columns(dates)
+
+        daily = [self.generate_daily_sales(date) for date in dates]
+        return OrderBatch.concat([orders for orders, _ in daily]), OrderItemBatch.concat([items for _, items in daily])
+
+    def _iter_chunks(self, start: datetime, end: datetime, workers: int, task: str) -> Iterator[Any]:
+        """期間を日付の塊に分割し、各塊に task（メソッド名）を適用した結果を日付順に返す
+
+        workers が 2 以上の場合は塊をプロセスプールに分散する。
+        各日はマスターシードと日付から派生した乱数列で生成されるため、
+        ワーカー数に関わらず同じ出力になる。先読みはワーカー数の2倍の塊までに抑える。
+        """
+        dates = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        metrics = self.metrics
+        metrics.begin(len(dates))
+        if self.calendar is not None:
+            # 期間の需要カレンダーを先に計算しておき、ワーカーにはその結果を渡す
+            self.calendar.prepare(start, end)
+        if workers <= 1:
+            # NumPy エンジンは月単位でまとめて生成する
+            for i in range(0, len(dates), 31):
+                chunk = dates[i : i + 31]
+                with metrics.stage("generate"):
+                    result = getattr(self, task)(chunk)
+                if metrics.enabled:
+                    metrics.advance(len(chunk), *_chunk_counts(task, result))
+                yield result
+            return
+
+        if self.seed is None:
+            # 並列生成には日付ごとの乱数列が必要なため、シード未指定ならここで決めて以降も使う
+            self.seed = random.SystemRandom().getrandbits(63)
+
+        # 月単位を上限に、ワーカーあたり数タスクになるよう日付を分割
+        chunk_size = max(1, min(31, -(-len(dates) // (workers * 4))))
+        chunks = [dates[i : i + chunk_size] for i in range(0, len(dates), chunk_size)]
+
+        def collect(days: int, future) -> Any:
+            with metrics.stage("generate"):
+                result = future.result()
+            if metrics.enabled:
+                metrics.advance(days, *_chunk_counts(task, result))
+            return result
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((len(chunk), executor.submit(_run_chunk, task, chunk)))
+                if len(pending) >= workers * 2:
+                    yield collect(*pending.popleft())
+            while pending:
+                yield collect(*pending.popleft())
+
+    def iter_daily_sales(self, start: datetime, end: datetime, workers: int = 1) -> Iterator[DailySales]:
+        """start から end（当日を含む）までの売上データを1日ずつ遅延生成"""
+        for days in self._iter_chunks(start, end, workers, "_generate_days"):
+            yield from days
+
+    def iter_column_batches(
+        self, start: datetime, end: datetime, workers: int = 1
+    ) -> Iterator[Tuple[OrderBatch, OrderItemBatch]]:
+        """start から end（当日を含む）までの売上データを列指向のバッチ（最大1ヶ月分）ごとに遅延生成"""
+        yield from self._iter_chunks(start, end, workers, "_generate_columns")
+
+    def generate_range_orders(
+        self, start: datetime, end: datetime, workers: int = 1
+    ) -> Tuple[OrderBatch, OrderItemBatch]:
+        """start から end（当日を含む）までの売上データをまとめて生成"""
+        batches = list(self.iter_column_batches(start, end, workers))
+        return OrderBatch.concat([orders for orders, _ in batches]), OrderItemBatch.concat([items for _, items in batches])
+
+    def generate_monthly_orders(
+        self, year: int, month: int, workers: int = 1
+    ) -> Tuple[OrderBatch, OrderItemBatch]:
+        """1ヶ月分の売上データを生成"""
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        return self.generate_range_orders(start, end, workers)
 
-        # Master Data generation
-        master_data = {
+    def build_master_data(self) -> Dict[str, List[Dict[str, Any]]]:
+        """マスターデータを生成"""
+        return {
             "categories": [{"id": cat.id, "name": cat.name} for cat in self.categories],
             "menu_items": [
                 {"id": item.id, "name": item.name, "price": item.price, "category_id": item.category_id}
@@ -360,164 +2352,1164 @@ class CafeMockGenerator:
             "time_slots": [{"id": ts.value, "name": ts.get_name(ts.value)} for ts in TimeSlot],
         }
 
+    def _build_name_lookups(self) -> None:
+        """注文の ID 列から名称を引く配列（ID を添字とする）をマスターデータから1回だけ構築"""
+        master_data = self.build_master_data()
+        self._name_lookups = []
+        for id_field, name_field, master_key in ORDER_NAME_FIELDS:
+            rows = master_data[master_key]
+            names = np.full(max(row["id"] for row in rows) + 1, "Unknown", dtype=object)
+            for row in rows:
+                names[row["id"]] = row["name"]
+            self._name_lookups.append((id_field, name_field, names))
+
+    def _export_columns(self, orders: OrderBatch, order_items: OrderItemBatch) -> Tuple[Dict[str, List], Dict[str, List]]:
+        """テキスト系出力用に、ID・日時文字列・名称の列をバッチ単位でまとめて作る"""
+        order_columns = {"id": orders.ids(), "timestamp": _format_timestamps(orders.timestamp).tolist()}
+        for name in ORDER_FIELDS[2:]:
+            order_columns[name] = getattr(orders, name).tolist()
+        for id_field, name_field, names in self._name_lookups:
+            order_columns[name_field] = names[getattr(orders, id_field)].tolist()
+
+        item_order_ids = order_items.order_ids()
+        item_columns = {
+            "id": _format_item_ids(item_order_ids, order_items.line_no),
+            "order_id": item_order_ids,
+            "menu_item_id": order_items.menu_item_id.tolist(),
+            "price": order_items.price.tolist(),
+        }
+        return order_columns, item_columns
+
+    def save_stream(
+        self,
+        days: Iterable[DailySales],
+        label: str,
+        formats: Iterable[str] = ("json", "csv"),
+        table_label: Optional[str] = None,
+        json_lines: bool = False,
+        output_dir: str = ".",
+        compression: Optional[str] = None,
+        compact_json: bool = False,
+    ) -> Tuple[int, int]:
+        """日ごとの売上データを受け取りながら各形式に逐次書き出す
+
+        各ライターは届いたバッチをそのまま追記するため、メモリ使用量は
+        1バッチ分に収まり期間の長さに依存しない。
+        JSON / Parquet / Arrow / SQLite / 集計表は label、CSV / Excel は table_label（省略時は label）を
+        ファイル名に使い、output_dir に書き出す。
+        compression（gzip / bz2 / xz / zstd）を指定すると、JSON / NDJSON / CSV を生成と並行して圧縮し、
+        拡張子（.gz など）を付けて書き出す。compact_json では JSON をインデントなしで書き出す。
+        書き出した注文数と注文アイテム数を返す。
+        """
+        formats = set(formats)
+        unknown = formats - set(OUTPUT_FORMATS)
+        if unknown:
+            raise ValueError(f"未対応の出力形式です: {', '.join(sorted(unknown))}")
+        if compression is not None and compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"未対応の圧縮形式です: {compression} (選択肢: {', '.join(COMPRESSION_EXTENSIONS)})")
+        suffix = COMPRESSION_EXTENSIONS[compression] if compression else ""
+        indent = None if compact_json else 2
+        table_label = table_label or label
+        output = Path(output_dir)
+        metrics = self.metrics
+
         # Save master data
-        with open(f"master_data_{year}-{month:02d}.json", "w", encoding="utf-8") as f:
-            json.dump(master_data, f, ensure_ascii=False, indent=2)
-
-        # Save normalized data
-        with open(f"orders_{year}-{month:02d}.json", "w", encoding="utf-8") as f:
-            json.dump(orders, f, ensure_ascii=False, indent=2)
-
-        with open(f"order_items_{year}-{month:02d}.json", "w", encoding="utf-8") as f:
-            json.dump(order_items, f, ensure_ascii=False, indent=2)
-
-        # マスターデータの読み込み
-        with open(f"master_data_{year}-{month:02d}.json", "r", encoding="utf-8") as f:
-            master_data = json.load(f)
-
-        # 既存のExcel出力コード
-        def export_original_excel(year: int, month: int, orders: List[Dict[str, Any]], master_data: Dict):
-            with pd.ExcelWriter(f"cafe_data_{year}_{month:02d}.xlsx") as writer:
-                # 元のシート形式を維持
-                orders_with_details = []
-                for order in orders:
-                    order_details = order.copy()
-
-                    # マスターデータから名称を取得
-                    order_details["gender"] = next(
-                        (g["name"] for g in master_data["genders"] if g["id"] == order["gender_id"]), "Unknown"
-                    )
-                    order_details["order_type"] = next(
-                        (ot["name"] for ot in master_data["order_types"] if ot["id"] == order["order_type_id"]),
-                        "Unknown",
-                    )
-                    order_details["weather"] = next(
-                        (w["name"] for w in master_data["weather_types"] if w["id"] == order["weather_id"]), "Unknown"
+        master_data = self.build_master_data()
+        metrics.add_output(output / f"master_data_{label}.json{suffix}")
+        with open_output(output / f"master_data_{label}.json{suffix}") as f:
+            if compact_json:
+                json.dump(master_data, f, ensure_ascii=False, separators=(",", ":"))
+            else:
+                json.dump(master_data, f, ensure_ascii=False, indent=2)
+
+        order_count, item_count = 0, 0
+        with ExitStack() as stack:
+            json_writers = None
+            if "json" in formats:
+                if json_lines:
+                    json_writers = (
+                        NdjsonWriter(output / f"orders_{label}.ndjson{suffix}"),
+                        NdjsonWriter(output / f"order_items_{label}.ndjson{suffix}"),
                     )
-                    order_details["time_slot"] = next(
-                        (ts["name"] for ts in master_data["time_slots"] if ts["id"] == order["time_slot_id"]), "Unknown"
+                else:
+                    json_writers = (
+                        JsonArrayWriter(output / f"orders_{label}.json{suffix}", indent),
+                        JsonArrayWriter(output / f"order_items_{label}.json{suffix}", indent),
                     )
-
-                    orders_with_details.append(order_details)
-
-                pd.DataFrame(orders_with_details).to_excel(writer, sheet_name="Orders", index=False)
-
-                # メニューデータ
-                # Drinks
-                pd.DataFrame(
-                    [
-                        {"id": item["id"], "name": item["name"], "price": item["price"]}
-                        for item in master_data["menu_items"]
-                        if item["category_id"] == 1
-                    ]
-                ).to_excel(writer, sheet_name="Drinks", index=False)
-
-                # Sandwiches
-                pd.DataFrame(
-                    [
-                        {"id": item["id"], "name": item["name"], "price": item["price"]}
-                        for item in master_data["menu_items"]
-                        if item["category_id"] == 2
-                    ]
-                ).to_excel(writer, sheet_name="Sandwiches", index=False)
-
-                # Cakes
-                pd.DataFrame(
-                    [
-                        {"id": item["id"], "name": item["name"], "price": item["price"]}
-                        for item in master_data["menu_items"]
-                        if item["category_id"] == 3
-                    ]
-                ).to_excel(writer, sheet_name="Cakes", index=False)
-
-        # 新しいマルチシート形式のExcelファイル出力
-        def export_comprehensive_excel(
-            year: int, month: int, orders: List[Dict[str, Any]], order_items: List[Dict[str, Any]], master_date: Dict
+                for writer in json_writers:
+                    stack.enter_context(writer)
+
+            csv_writer = None
+            if "csv" in formats:
+                csv_writer = stack.enter_context(
+                    CsvWriter(output / f"orders_{table_label}.csv{suffix}", ORDER_CSV_FIELDS)
+                )
+
+            excel_writers = None
+            if "excel" in formats:
+                excel_writers = (
+                    stack.enter_context(self._open_original_excel(output / f"cafe_data_{table_label}.xlsx", master_data)),
+                    stack.enter_context(
+                        self._open_comprehensive_excel(
+                            output / f"cafe_comprehensive_data_{table_label}.xlsx", master_data
+                        )
+                    ),
+                )
+
+            columnar_exporters = []
+            for file_format in COLUMNAR_FORMATS:
+                if file_format in formats:
+                    exporter = ColumnarExporter(output / f"{file_format}_{label}", master_data, file_format)
+                    columnar_exporters.append((file_format, stack.enter_context(exporter)))
+
+            database = None
+            if "sqlite" in formats:
+                database = stack.enter_context(DatabaseSink.sqlite(output / f"cafe_{label}.sqlite", master_data))
+
+            rollup = SalesRollup(master_data) if "summary" in formats else None
+
+            if metrics.enabled:
+                # 出力バイト数を数えるため、選んだ形式の出力先を登録する
+                extension = "ndjson" if json_lines else "json"
+                outputs = {
+                    "json": [f"orders_{label}.{extension}{suffix}", f"order_items_{label}.{extension}{suffix}"],
+                    "csv": [f"orders_{table_label}.csv{suffix}"],
+                    "excel": [f"cafe_data_{table_label}.xlsx", f"cafe_comprehensive_data_{table_label}.xlsx"],
+                    "parquet": [f"parquet_{label}"],
+                    "arrow": [f"arrow_{label}"],
+                    "sqlite": [f"cafe_{label}.sqlite"],
+                    "summary": [f"summary_{label}"],
+                }
+                for file_format in OUTPUT_FORMATS:
+                    if file_format in formats:
+                        for name in outputs[file_format]:
+                            metrics.add_output(output / name)
+
+            text_formats = json_writers or csv_writer or excel_writers or database
+            for _, orders, order_items in days:
+                for file_format, exporter in columnar_exporters:
+                    with metrics.stage(file_format):
+                        exporter.write(orders, order_items)
+                if text_formats:
+                    # ID・日時の文字列化と名称の付与はテキスト系の出力ごとではなく、ここで1回だけ行う
+                    with metrics.stage("format"):
+                        order_columns, item_columns = self._export_columns(orders, order_items)
+                        order_rows = _rows(order_columns, ORDER_FIELDS)
+                        item_rows = _rows(item_columns, ORDER_ITEM_FIELDS)
+                if json_writers:
+                    with metrics.stage("json"):
+                        json_writers[0].write(dict(zip(ORDER_FIELDS, row)) for row in order_rows)
+                        json_writers[1].write(dict(zip(ORDER_ITEM_FIELDS, row)) for row in item_rows)
+                if csv_writer:
+                    with metrics.stage("csv"):
+                        csv_columns = {
+                            f"{name_field}_name": order_columns[name_field] for _, name_field, _ in ORDER_NAME_FIELDS
+                        }
+                        csv_columns.update(order_columns, order_id=[""] * len(orders))
+                        csv_writer.write_rows(_rows(csv_columns, ORDER_CSV_FIELDS))
+                if excel_writers:
+                    with metrics.stage("excel"):
+                        original, comprehensive = excel_writers
+                        original.write_rows("Orders", _rows(order_columns, ORDER_EXCEL_FIELDS))
+                        comprehensive.write_rows("Orders", order_rows)
+                        comprehensive.write_rows("Order Items", item_rows)
+                if database:
+                    with metrics.stage("sqlite"):
+                        database.write_rows(order_rows, item_rows)
+                if rollup:
+                    with metrics.stage("summary"):
+                        rollup.update(orders, order_items)
+                order_count += len(orders)
+                item_count += len(order_items)
+
+            # ファイルを閉じる処理（Excel の保存や索引の作成、圧縮の残り）も計測する
+            with metrics.stage("finalize"):
+                stack.close()
+
+        if rollup:
+            with metrics.stage("summary"):
+                rollup.save(output / f"summary_{label}")
+        return order_count, item_count
+
+    def save_columnar(
+        self,
+        batches: Iterable[Tuple[OrderBatch, OrderItemBatch]],
+        label: str,
+        formats: Iterable[str] = ("parquet",),
+        output_dir: str = ".",
+    ) -> Tuple[int, int]:
+        """列指向のバッチを辞書に変換せず、そのまま Parquet / Arrow データセットに書き出す"""
+        master_data = self.build_master_data()
+        order_count, item_count = 0, 0
+        with ExitStack() as stack:
+            exporters = []
+            for file_format in formats:
+                root = Path(output_dir) / f"{file_format}_{label}"
+                exporters.append((file_format, stack.enter_context(ColumnarExporter(root, master_data, file_format))))
+                self.metrics.add_output(root)
+            for orders, order_items in batches:
+                for file_format, exporter in exporters:
+                    with self.metrics.stage(file_format):
+                        exporter.write(orders, order_items)
+                order_count += len(orders)
+                item_count += len(order_items)
+            with self.metrics.stage("finalize"):
+                stack.close()
+        return order_count, item_count
+
+    @staticmethod
+    def _open_original_excel(path: str, master_data: Dict) -> ExcelStreamWriter:
+        """元のシート形式（注文 + カテゴリ別メニュー）の Excel を開く"""
+        writer = ExcelStreamWriter(path)
+        writer.add_sheet("Orders", ORDER_EXCEL_FIELDS)
+
+        # メニューデータ
+        for category_id, sheet_name in ((1, "Drinks"), (2, "Sandwiches"), (3, "Cakes")):
+            writer.add_sheet(sheet_name, ["id", "name", "price"])
+            writer.write(sheet_name, (item for item in master_data["menu_items"] if item["category_id"] == category_id))
+        return writer
+
+    @staticmethod
+    def _open_comprehensive_excel(path: str, master_data: Dict) -> ExcelStreamWriter:
+        """マルチシート形式（正規化データ + マスターデータ）の Excel を開く"""
+        writer = ExcelStreamWriter(path)
+        writer.add_sheet("Orders", ORDER_FIELDS)
+        writer.add_sheet("Order Items", ORDER_ITEM_FIELDS)
+
+        # マスターデータシート
+        for key, sheet_name in (
+            ("categories", "Categories"),
+            ("menu_items", "Menu Items"),
+            ("genders", "Genders"),
+            ("order_types", "Order Types"),
+            ("weather_types", "Weather Types"),
+            ("time_slots", "Time Slots"),
         ):
-            with pd.ExcelWriter(f"cafe_comprehensive_data_{year}_{month:02d}.xlsx") as writer:
-                # 注文データ
-                pd.DataFrame(orders).to_excel(writer, sheet_name="Orders", index=False)
-
-                # 注文アイテム
-                pd.DataFrame(order_items).to_excel(writer, sheet_name="Order Items", index=False)
-
-                # マスターデータシート
-                pd.DataFrame(master_data["categories"]).to_excel(writer, sheet_name="Categories", index=False)
-                pd.DataFrame(master_data["menu_items"]).to_excel(writer, sheet_name="Menu Items", index=False)
-                pd.DataFrame(master_data["genders"]).to_excel(writer, sheet_name="Genders", index=False)
-                pd.DataFrame(master_data["order_types"]).to_excel(writer, sheet_name="Order Types", index=False)
-                pd.DataFrame(master_data["weather_types"]).to_excel(writer, sheet_name="Weather Types", index=False)
-                pd.DataFrame(master_data["time_slots"]).to_excel(writer, sheet_name="Time Slots", index=False)
-
-        # 両方のエクスポートを実行
-        export_original_excel(year, month, orders, master_data)
-        export_comprehensive_excel(year, month, orders, order_items, master_data)
-
-        # CSV出力
-        order_fields = [
-            "id",
-            "order_id",
-            "timestamp",
-            "gender_id",
-            "gender_name",
-            "order_type_id",
-            "order_type_name",
-            "weather_id",
-            "weather_name",
-            "time_slot_id",
-            "time_slot_name",
-            "total_price",
-            "discount",
-        ]
+            writer.add_sheet(sheet_name, list(master_data[key][0]))
+            writer.write(sheet_name, master_data[key])
+        return writer
+
+    def save_to_files(
+        self,
+        order_data: Tuple[OrderBatch, OrderItemBatch],
+        year: int,
+        month: int,
+        formats: Iterable[str] = MONTHLY_OUTPUT_FORMATS,
+        compression: Optional[str] = None,
+        compact_json: bool = False,
+    ):
+        """データを各形式で保存 - 正規化されたスキーマで保存"""
+        orders, order_items = order_data
+        self.save_stream(
+            [(datetime(year, month, 1), orders, order_items)],
+            f"{year}-{month:02d}",
+            formats=formats,
+            table_label=f"{year}_{month:02d}",
+            compression=compression,
+            compact_json=compact_json,
+        )
 
-        def enrich_order_with_names(order, master_data):
-            enriched_order = order.copy()
+    def generate_test_data(
+        self,
+        year: int = 2024,
+        month: int = 4,
+        workers: int = 1,
+        formats: Iterable[str] = MONTHLY_OUTPUT_FORMATS,
+        compression: Optional[str] = None,
+        compact_json: bool = False,
+    ) -> None:
+        """テストデータを生成して各形式で保存"""
+        print(f"{year}年{month}月のカフェ売上データを生成します...")
+        order_data = self.generate_monthly_orders(year, month, workers)
+        self.save_to_files(order_data, year, month, formats, compression, compact_json)
+        print("\nデータ生成が完了しました。")
 
-            # マスターデータから名称を取得
-            enriched_order["gender_name"] = next(
-                (g["name"] for g in master_data["genders"] if g["id"] == order["gender_id"]), "Unknown"
-            )
-            enriched_order["order_type_name"] = next(
-                (ot["name"] for ot in master_data["order_types"] if ot["id"] == order["order_type_id"]),
-                "Unknown",
-            )
-            enriched_order["weather_name"] = next(
-                (w["name"] for w in master_data["weather_types"] if w["id"] == order["weather_id"]), "Unknown"
-            )
-            enriched_order["time_slot_name"] = next(
-                (ts["name"] for ts in master_data["time_slots"] if ts["id"] == order["time_slot_id"]), "Unknown"
+    def generate_range_data(
+        self,
+        start: datetime,
+        end: datetime,
+        workers: int = 1,
+        formats: Iterable[str] = ("json", "csv"),
+        json_lines: bool = False,
+        compression: Optional[str] = None,
+        compact_json: bool = False,
+    ) -> None:
+        """任意の期間のテストデータを1日ずつ生成しながら各形式に保存"""
+        print(f"{start:%Y-%m-%d}〜{end:%Y-%m-%d}のカフェ売上データを生成します...")
+        order_count, item_count = self.save_range(
+            start, end, workers, formats, json_lines, compression=compression, compact_json=compact_json
+        )
+        print(f"\n注文 {order_count} 件、注文アイテム {item_count} 件を出力しました。")
+
+    def save_range(
+        self,
+        start: datetime,
+        end: datetime,
+        workers: int = 1,
+        formats: Iterable[str] = ("json", "csv"),
+        json_lines: bool = False,
+        output_dir: str = ".",
+        compression: Optional[str] = None,
+        compact_json: bool = False,
+    ) -> Tuple[int, int]:
+        """期間の売上データを生成しながら output_dir に保存し、注文数と注文アイテム数を返す"""
+        label = f"{start:%Y%m%d}-{end:%Y%m%d}"
+        text_options = {"output_dir": output_dir, "compression": compression, "compact_json": compact_json}
+        if set(formats) <= set(COLUMNAR_FORMATS):
+            # Parquet / Arrow のみの場合は列指向のまま書き出す
+            return self.save_columnar(self.iter_column_batches(start, end, workers), label, formats, output_dir)
+        if set(formats) <= set(BATCH_FORMATS):
+            # 日ごとに分けず、1ヶ月分のバッチ単位で書き出す
+            batches = ((start, orders, order_items) for orders, order_items in self.iter_column_batches(start, end, workers))
+            return self.save_stream(batches, label, formats=formats, **text_options)
+        return self.save_stream(
+            self.iter_daily_sales(start, end, workers), label, formats=formats, json_lines=json_lines, **text_options
+        )
+
+    def save_shard(
+        self,
+        start: datetime,
+        end: datetime,
+        index: int,
+        count: int,
+        workers: int = 1,
+        formats: Iterable[str] = ("json", "csv"),
+        json_lines: bool = False,
+        output_dir: Optional[str] = None,
+        compression: Optional[str] = None,
+        compact_json: bool = False,
+    ) -> "ShardManifest":
+        """期間を count 個に分けた index 番目（1始まり）のシャードを生成し、出力とマニフェストを保存
+
+        出力先は output_dir（省略時は shards_<期間>）の下の shard-IIII-of-NNNN/ になる。
+        各日はマスターシードと日付だけから生成されるため、merge_shards で結合すると
+        同じシードで期間全体を1回で生成した場合と同じ出力になる。
+        """
+        if self.seed is None:
+            raise ValueError("シャードごとの生成にはマスターシードの指定が必要です")
+        if self.store is not None:
+            raise ValueError("チェーンの店舗はシャードごとの生成に対応していません")
+        formats = list(formats)
+        if not 1 <= index <= count:
+            raise ValueError(f"シャード番号は 1〜{count} で指定してください: {index}")
+        shard_start, shard_end = split_date_range(start, end, count)[index - 1]
+
+        directory = Path(output_dir or f"shards_{start:%Y%m%d}-{end:%Y%m%d}") / f"shard-{index:04d}-of-{count:04d}"
+        directory.mkdir(parents=True, exist_ok=True)
+        order_count, item_count = self.save_range(
+            shard_start, shard_end, workers, formats, json_lines, str(directory), compression, compact_json
+        )
+        manifest = ShardManifest(
+            index=index,
+            count=count,
+            seed=self.seed,
+            engine=self.engine,
+            config_sha256=config_digest(self.config_path),
+            start=f"{start:%Y-%m-%d}",
+            end=f"{end:%Y-%m-%d}",
+            shard_start=f"{shard_start:%Y-%m-%d}",
+            shard_end=f"{shard_end:%Y-%m-%d}",
+            formats=formats,
+            json_lines=json_lines,
+            compression=compression,
+            compact_json=compact_json,
+            orders=order_count,
+            order_items=item_count,
+            master_data=self.build_master_data(),
+        )
+        manifest.save(directory)
+        return manifest
+
+
+def load_store_profiles(path: str) -> List[StoreProfile]:
+    """店舗プロファイルの YAML（stores: のリスト）を読み込む"""
+    stores = [StoreProfile(**store) for store in load_config(path)["stores"]]
+    ids = [store.id for store in stores]
+    if len(set(ids)) != len(ids) or min(ids, default=1) < 1:
+        raise ValueError("店舗 ID は1以上の重複しない整数で指定してください")
+    return stores
+
+
+def expand_store_profiles(stores: List[StoreProfile], count: int) -> List[StoreProfile]:
+    """店舗プロファイルを順に複製して count 店舗にする（複製の ID は既存の最大 ID の続き）"""
+    next_id = max(store.id for store in stores) + 1
+    expanded = list(stores[:count])
+    for i in range(len(expanded), count):
+        base = stores[i % len(stores)]
+        expanded.append(
+            StoreProfile(
+                id=next_id,
+                name=f"{base.name} {i // len(stores) + 1}",
+                customer_scale=base.customer_scale,
+                weather_region=base.weather_region,
+                menu_overrides=base.menu_overrides,
             )
+        )
+        next_id += 1
+    return expanded
+
+
+class CafeChainGenerator:
+    """複数店舗（チェーン）の売上データを店舗単位で並列に生成し、店舗ごとのディレクトリに書き出す
+
+    各店舗は StoreProfile を反映した CafeMockGenerator で生成する。乱数列はマスターシード・店舗 ID・日付から
+    派生し、天気は同じ weather_region の店舗で共有する。注文 ID は店舗 ID を含むため店舗間で一意になる。
+    """
+
+    def __init__(
+        self,
+        config_path: str = "config.yaml",
+        stores: Optional[List[StoreProfile]] = None,
+        engine: str = "python",
+        seed: Optional[int] = None,
+    ):
+        self.config_path = config_path
+        self.stores = stores or [StoreProfile(1, "本店")]
+        self.engine = engine
+        # 地域の天気を店舗間でそろえるため、シード未指定ならここで決める
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(63)
+
+        # 店舗プロファイルの誤りは生成を始める前に検出する
+        config = load_config(config_path)
+        for store in self.stores:
+            store.apply(config)
+
+    def _save_store(
+        self,
+        store: StoreProfile,
+        start: datetime,
+        end: datetime,
+        root: Path,
+        formats: Iterable[str],
+        json_lines: bool,
+        compression: Optional[str] = None,
+        compact_json: bool = False,
+    ) -> Tuple[int, int]:
+        """1店舗分の期間を生成して store=NNNN/ に保存"""
+        generator = CafeMockGenerator(self.config_path, engine=self.engine, seed=self.seed, store=store)
+        store_dir = root / f"store={store.id:04d}"
+        store_dir.mkdir(parents=True, exist_ok=True)
+        return generator.save_range(
+            start,
+            end,
+            formats=formats,
+            json_lines=json_lines,
+            output_dir=store_dir,
+            compression=compression,
+            compact_json=compact_json,
+        )
 
-            return enriched_order
+    def generate_range_data(
+        self,
+        start: datetime,
+        end: datetime,
+        workers: int = 1,
+        formats: Iterable[str] = ("json", "csv"),
+        json_lines: bool = False,
+        output_dir: Optional[str] = None,
+        compression: Optional[str] = None,
+        compact_json: bool = False,
+    ) -> Tuple[int, int]:
+        """全店舗の期間の売上データを保存し、注文数と注文アイテム数の合計を返す"""
+        formats = tuple(formats)
+        root = Path(output_dir or f"chain_{start:%Y%m%d}-{end:%Y%m%d}")
+        root.mkdir(parents=True, exist_ok=True)
+        with open(root / "stores.json", "w", encoding="utf-8") as f:
+            json.dump([asdict(store) for store in self.stores], f, ensure_ascii=False, indent=2)
+
+        print(f"{len(self.stores)} 店舗の {start:%Y-%m-%d}〜{end:%Y-%m-%d} の売上データを生成します...")
+        if workers <= 1:
+            counts = [
+                self._save_store(store, start, end, root, formats, json_lines, compression, compact_json)
+                for store in self.stores
+            ]
+        else:
+            chunk_size = max(1, len(self.stores) // (workers * 4))
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_chain_worker,
+                initargs=(self, start, end, root, formats, json_lines, compression, compact_json),
+            ) as executor:
+                counts = list(executor.map(_run_store, self.stores, chunksize=chunk_size))
 
-        # 注文データのCSV出力
-        csv_orders = [enrich_order_with_names(order, master_data) for order in orders]
-        with open(f"orders_{year}_{month:02d}.csv", "w", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=order_fields)
-            writer.writeheader()
-            writer.writerows(csv_orders)
+        order_count = sum(orders for orders, _ in counts)
+        item_count = sum(items for _, items in counts)
+        print(f"\n{root}/ に注文 {order_count} 件、注文アイテム {item_count} 件を出力しました。")
+        return order_count, item_count
+
+
+# シャードの出力ディレクトリに置くマニフェストのファイル名
+SHARD_MANIFEST = "manifest.json"
 
-    def generate_test_data(self, year: int = 2024, month: int = 4) -> None:
-        """テストデータを生成して各形式で保存"""
-        print(f"{year}年{month}月のカフェ売上データを生成します...")
-        order_data = self.generate_monthly_orders(year, month)
-        self.save_to_files(order_data, year, month)
-        print("\nデータ生成が完了しました。")
 
+@dataclass
+class ShardManifest:
+    """期間を分割して生成したシャード1つ分の記録（merge_shards が整合性の確認と結合に使う）"""
+
+    index: int  # 1始まりのシャード番号
+    count: int  # シャードの総数
+    seed: int
+    engine: str
+    config_sha256: str  # 設定ファイルの内容の SHA-256
+    start: str  # 分割前の期間（YYYY-MM-DD、当日を含む）
+    end: str
+    shard_start: str  # このシャードの期間
+    shard_end: str
+    formats: List[str]
+    json_lines: bool = False
+    compression: Optional[str] = None
+    compact_json: bool = False
+    orders: int = 0
+    order_items: int = 0
+    master_data: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+
+    @property
+    def label(self) -> str:
+        """分割前の期間のラベル（結合後のファイル名に使う）"""
+        return f"{self.start.replace('-', '')}-{self.end.replace('-', '')}"
+
+    @property
+    def shard_label(self) -> str:
+        """このシャードの期間のラベル（シャード内のファイル名に使う）"""
+        return f"{self.shard_start.replace('-', '')}-{self.shard_end.replace('-', '')}"
+
+    def save(self, directory: Path) -> None:
+        with open(Path(directory) / SHARD_MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, ensure_ascii=False, indent=2)
 
-def main():
+    @classmethod
+    def load(cls, directory: Path) -> "ShardManifest":
+        with open(Path(directory) / SHARD_MANIFEST, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+
+def split_date_range(start: datetime, end: datetime, count: int) -> List[Tuple[datetime, datetime]]:
+    """start から end（当日を含む）までを、日数ができるだけ均等な count 個の連続した期間に分割"""
+    days = (end - start).days + 1
+    if not 1 <= count <= days:
+        raise ValueError(f"シャード数は 1〜{days}（期間の日数）で指定してください: {count}")
+    bounds = [days * i // count for i in range(count + 1)]
+    return [(start + timedelta(days=bounds[i]), start + timedelta(days=bounds[i + 1] - 1)) for i in range(count)]
+
+
+def _find_shard_dirs(paths: Iterable[str]) -> List[Path]:
+    """シャードのディレクトリ、またはシャードのディレクトリを含むディレクトリの一覧を展開"""
+    shard_dirs = []
+    for path in map(Path, paths):
+        if (path / SHARD_MANIFEST).exists():
+            shard_dirs.append(path)
+        else:
+            shard_dirs.extend(sorted(p.parent for p in path.glob(f"*/{SHARD_MANIFEST}")))
+    return shard_dirs
+
+
+def _check_shards(manifests: List[ShardManifest]) -> None:
+    """全シャードがそろっていて、同じシード・エンジン・設定・形式で期間を隙間なく覆っているか確認"""
+    if not manifests:
+        raise ValueError("シャードが見つかりません")
+    first = manifests[0]
+    keys = ("count", "seed", "engine", "config_sha256", "start", "end", "formats", "json_lines", "compression")
+    for key in keys + ("compact_json", "master_data"):
+        values = {json.dumps(getattr(m, key), sort_keys=True) for m in manifests}
+        if len(values) > 1:
+            raise ValueError(f"シャード間で {key} が一致しません")
+    indexes = [m.index for m in manifests]
+    if indexes != list(range(1, first.count + 1)):
+        missing = sorted(set(range(1, first.count + 1)) - set(indexes))
+        raise ValueError(f"シャードが不足または重複しています（不足: {missing or 'なし'}）")
+    expected = split_date_range(_parse_date(first.start), _parse_date(first.end), first.count)
+    for manifest, (shard_start, shard_end) in zip(manifests, expected):
+        if (manifest.shard_start, manifest.shard_end) != (f"{shard_start:%Y-%m-%d}", f"{shard_end:%Y-%m-%d}"):
+            raise ValueError(f"シャード {manifest.index} の期間が分割と一致しません")
+
+
+def _concat_json_arrays(sources: List[Path], target: Path, compact: bool = False, chunk_size: int = 1 << 20) -> None:
+    """JsonArrayWriter の出力（"[" + 要素 + "\n]"、コンパクトなら "]" で閉じる。空なら "[]"）を1つの配列に結合
+
+    圧縮されたファイルは展開しながら読むためシークできない。閉じ括弧の分だけ末尾を持ち越しながら書き写す。
+    """
+    tail = b"]" if compact else b"\n]"
+    with open_output(str(target), binary=True) as out:
+        written = False
+        for source in sources:
+            with open_input(str(source)) as f:
+                f.read(1)
+                pending, started = b"", False
+                while True:
+                    data = f.read(chunk_size)
+                    if not data:
+                        break
+                    pending += data
+                    if len(pending) > len(tail):
+                        if not started:
+                            out.write(b"," if written else b"[")
+                            started = True
+                        out.write(pending[: -len(tail)])
+                        pending = pending[-len(tail) :]
+            written = written or started
+        out.write(tail if written else b"[]")
+
+
+def _concat_files(sources: List[Path], target: Path, header_lines: int = 0) -> None:
+    """ファイルを順に結合（2つ目以降は先頭の header_lines 行を除く。圧縮されたファイルは展開して結合し直す）"""
+    with open_output(str(target), binary=True) as out:
+        for i, source in enumerate(sources):
+            with open_input(str(source)) as f:
+                if i:
+                    for _ in range(header_lines):
+                        f.readline()
+                shutil.copyfileobj(f, out)
+
+
+def _iter_partition_tables(root: Path, file_format: str) -> Iterator[Tuple[np.datetime64, Any]]:
+    """year=YYYY/month=M に分割したデータセットを年月・ファイル順に行グループ単位で読む"""
+    pa, pq = _import_pyarrow()
+
+    def key(path: Path) -> Tuple[int, ...]:
+        month_dir = path.parent
+        year = int(month_dir.parent.name.split("=")[1])
+        return year, int(month_dir.name.split("=")[1]), int(path.stem.split("-")[1])
+
+    for path in sorted(root.glob(f"year=*/month=*/part-*.{file_format}"), key=key):
+        year, month, _ = key(path)
+        partition = np.datetime64(f"{year:04d}-{month:02d}", "M")
+        if file_format == "parquet":
+            parquet_file = pq.ParquetFile(path)
+            for i in range(parquet_file.num_row_groups):
+                yield partition, parquet_file.read_row_group(i)
+        else:
+            with pa.memory_map(str(path)) as source:
+                reader = pa.ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    yield partition, pa.Table.from_batches([reader.get_batch(i)])
+
+
+def merge_shards(shard_paths: Iterable[str], output_dir: str = ".") -> ShardManifest:
+    """save_shard で生成したシャードの出力を結合し、期間全体を1回で生成した場合と同じファイルを output_dir に書き出す
+
+    JSON / NDJSON / CSV（圧縮した場合も）/ 集計表はバイト単位で同一、Excel / Parquet / Arrow / SQLite は内容が同一になる
+    （ファイル内部の圧縮やページ配置は異なりうる）。マスターデータは全シャードで一致を確認して1つにまとめる。
+    結合した期間全体の内容を表すマニフェストを返す。
+    """
+    shards = sorted(((ShardManifest.load(d), d) for d in _find_shard_dirs(shard_paths)), key=lambda s: s[0].index)
+    manifests = [manifest for manifest, _ in shards]
+    shard_dirs = [directory for _, directory in shards]
+    _check_shards(manifests)
+    first = manifests[0]
+    formats, label, master_data = set(first.formats), first.label, first.master_data
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+
+    suffix = COMPRESSION_EXTENSIONS[first.compression] if first.compression else ""
+
+    def sources(pattern: str) -> List[Path]:
+        return [d / pattern.format(label=m.shard_label) for d, m in zip(shard_dirs, manifests)]
+
+    if not formats <= set(COLUMNAR_FORMATS):
+        with open_output(str(output / f"master_data_{label}.json{suffix}")) as f:
+            if first.compact_json:
+                json.dump(master_data, f, ensure_ascii=False, separators=(",", ":"))
+            else:
+                json.dump(master_data, f, ensure_ascii=False, indent=2)
+
+    if "json" in formats:
+        for table in ("orders", "order_items"):
+            if first.json_lines:
+                name = f"{table}_{{label}}.ndjson{suffix}"
+                _concat_files(sources(name), output / name.format(label=label))
+            else:
+                name = f"{table}_{{label}}.json{suffix}"
+                _concat_json_arrays(sources(name), output / name.format(label=label), first.compact_json)
+
+    if "csv" in formats:
+        name = f"orders_{{label}}.csv{suffix}"
+        _concat_files(sources(name), output / name.format(label=label), header_lines=1)
+
+    if "excel" in formats:
+        from openpyxl import load_workbook
+
+        for name, open_writer, sheets in (
+            ("cafe_data", CafeMockGenerator._open_original_excel, ["Orders"]),
+            ("cafe_comprehensive_data", CafeMockGenerator._open_comprehensive_excel, ["Orders", "Order Items"]),
+        ):
+            with open_writer(output / f"{name}_{label}.xlsx", master_data) as writer:
+                for source in sources(f"{name}_{{label}}.xlsx"):
+                    workbook = load_workbook(source, read_only=True)
+                    for sheet in sheets:
+                        # 行数の上限で分かれた続きのシート（「Orders 2」など）も順に読む
+                        titles = [t for t in workbook.sheetnames if t == sheet or t.startswith(f"{sheet} ")]
+                        for title in titles:
+                            writer.write_rows(sheet, workbook[title].iter_rows(min_row=2, values_only=True))
+                    workbook.close()
+
+    for file_format in COLUMNAR_FORMATS:
+        if file_format in formats:
+            with ColumnarExporter(output / f"{file_format}_{label}", master_data, file_format) as exporter:
+                for table in ("orders", "order_items"):
+                    for source in sources(f"{file_format}_{{label}}/{table}"):
+                        for partition, data in _iter_partition_tables(source, file_format):
+                            exporter.append(table, partition, data)
+
+    if "sqlite" in formats:
+        import sqlite3
+
+        with DatabaseSink.sqlite(output / f"cafe_{label}.sqlite", master_data) as database:
+            for source in sources("cafe_{label}.sqlite"):
+                connection = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+                try:
+                    for table, fields in (("orders", ORDER_FIELDS), ("order_items", ORDER_ITEM_FIELDS)):
+                        cursor = connection.execute(f"SELECT {', '.join(fields)} FROM {table} ORDER BY rowid")
+                        while True:
+                            rows = cursor.fetchmany(65536)
+                            if not rows:
+                                break
+                            order_rows, item_rows = (rows, []) if table == "orders" else ([], rows)
+                            database.write_rows(order_rows, item_rows)
+                finally:
+                    connection.close()
+
+    if "summary" in formats:
+        rollup = SalesRollup(master_data)
+        for source in sources("summary_{label}"):
+            rollup.merge(SalesRollup.load(source, master_data))
+        rollup.save(output / f"summary_{label}")
+
+    return ShardManifest(
+        **{
+            **asdict(first),
+            "index": 1,
+            "count": 1,
+            "shard_start": first.start,
+            "shard_end": first.end,
+            "orders": sum(m.orders for m in manifests),
+            "order_items": sum(m.order_items for m in manifests),
+        }
+    )
+
+
+class OrderReplayer:
+    """注文を時刻順に実時間（または speed 倍速）で送出する asyncio ベースのリプレイヤー
+
+    生成はスレッドで1日ずつ先行して行い、最大 buffer_days 日分を上限付きキューに貯める。
+    送出先が詰まる（drain やコールバックが待たされる）とキューが埋まり、生成も止まる。
+    各注文は注文アイテムを "items" に含めた辞書として送出する。speed が 0 以下なら待たずに最大速度で送出する。
+    """
+
+    def __init__(
+        self,
+        generator: "CafeMockGenerator",
+        start: datetime,
+        end: datetime,
+        speed: float = 1.0,
+        workers: int = 1,
+        buffer_days: int = 8,
+        max_batch: int = 4096,
+    ):
+        self.generator = generator
+        self.start = start
+        self.end = end
+        self.speed = speed
+        self.workers = workers
+        self.buffer_days = buffer_days
+        self.max_batch = max_batch
+
+    def _day_events(self, orders: OrderBatch, order_items: OrderItemBatch) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """1日分のバッチを時刻順の (経過秒の配列, 注文の辞書のリスト) に変換"""
+        orders = orders.take(np.argsort(orders.timestamp, kind="stable"))
+        order_columns, item_columns = self.generator._export_columns(orders, order_items)
+
+        # 注文アイテムは生成順（日内連番の昇順）なので、連番の範囲で各注文に振り分ける
+        item_rows = _rows(item_columns, ["id", "menu_item_id", "price"])
+        lower = np.searchsorted(order_items.seq, orders.seq, side="left").tolist()
+        upper = np.searchsorted(order_items.seq, orders.seq, side="right").tolist()
+        events = []
+        for row, first, last in zip(_rows(order_columns, ORDER_FIELDS), lower, upper):
+            event = dict(zip(ORDER_FIELDS, row))
+            event["items"] = [{"id": i, "menu_item_id": m, "price": p} for i, m, p in item_rows[first:last]]
+            events.append(event)
+        return orders.timestamp.astype(np.int64), events
+
+    async def _produce(self, queue: "asyncio.Queue") -> None:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        days = self.generator.iter_daily_sales(self.start, self.end, self.workers)
+        while True:
+            day = await loop.run_in_executor(None, partial(next, days, None))
+            if day is None:
+                break
+            _, orders, order_items = day
+            await queue.put(self._day_events(orders, order_items))
+        await queue.put(None)
+
+    async def run(self, emit: Callable[[List[Dict[str, Any]]], Awaitable[None]]) -> int:
+        """注文を時刻に合わせて emit（注文のリストを受け取るコルーチン関数）に渡し、送出件数を返す"""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.buffer_days)
+        producer = asyncio.ensure_future(self._produce(queue))
+        origin: Optional[Tuple[float, int]] = None
+        sent = 0
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                seconds, events = chunk
+                if not events:
+                    continue
+                if origin is None:
+                    origin = (loop.time(), int(seconds[0]))
+                due = origin[0] + (seconds - origin[1]) / self.speed if self.speed > 0 else None
+
+                i = 0
+                while i < len(events):
+                    if due is None:
+                        j = len(events)
+                    else:
+                        # 期限を過ぎた注文をまとめて送出し、次の注文まで待つ
+                        now = loop.time()
+                        j = int(np.searchsorted(due, now, side="right"))
+                        if j <= i:
+                            await asyncio.sleep(due[i] - now)
+                            continue
+                    j = min(j, i + self.max_batch)
+                    await emit(events[i:j])
+                    sent += j - i
+                    i = j
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+        return sent
+
+    async def to_stream(self, writer: "asyncio.StreamWriter") -> int:
+        """StreamWriter（ソケットやパイプ）に NDJSON で送出（drain で送出先の詰まりを待つ）"""
+
+        async def emit(events: List[Dict[str, Any]]) -> None:
+            writer.write(_encode_ndjson(events))
+            await writer.drain()
+
+        return await self.run(emit)
+
+    async def to_callback(self, callback: Callable[[Dict[str, Any]], Any]) -> int:
+        """注文ごとに callback を呼び出す（コルーチン関数なら完了を待つ）"""
+
+        async def emit(events: List[Dict[str, Any]]) -> None:
+            for event in events:
+                result = callback(event)
+                if inspect.isawaitable(result):
+                    await result
+
+        return await self.run(emit)
+
+    async def to_target(self, target: str) -> int:
+        """"-"（標準出力）、"tcp://host:port"、"unix:///path" のいずれかに NDJSON で送出"""
+        import asyncio
+
+        if target == "-":
+            return await self._to_stdout()
+        if target.startswith("tcp://"):
+            host, _, port = target[len("tcp://") :].rpartition(":")
+            _, writer = await asyncio.open_connection(host, int(port))
+        elif target.startswith("unix://"):
+            _, writer = await asyncio.open_unix_connection(target[len("unix://") :])
+        else:
+            raise ValueError(f"未対応の送出先です: {target}（-、tcp://host:port、unix:///path）")
+        try:
+            return await self.to_stream(writer)
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    async def _to_stdout(self) -> int:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        try:
+            transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+        except (ValueError, OSError):
+            # 通常のファイルへのリダイレクトはパイプとして扱えないため、同期的に書き込む
+            async def emit(events: List[Dict[str, Any]]) -> None:
+                sys.stdout.buffer.write(_encode_ndjson(events))
+
+            sent = await self.run(emit)
+            sys.stdout.flush()
+            return sent
+        writer = asyncio.StreamWriter(transport, protocol, None, loop)
+        try:
+            return await self.to_stream(writer)
+        finally:
+            transport.close()
+
+
+def _encode_ndjson(events: List[Dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n" for event in events).encode(
+        "utf-8"
+    )
+
+
+# プロセスプールのワーカーごとに保持するジェネレーター
+_worker_generator: Optional[CafeMockGenerator] = None
+
+
+def _chunk_counts(task: str, result: Any) -> Tuple[int, int]:
+    """_iter_chunks の1塊分の結果から (注文数, 注文アイテム数) を数える"""
+    if task == "_generate_days":
+        return sum(len(orders) for _, orders, _ in result), sum(len(items) for _, _, items in result)
+    orders, order_items = result
+    return len(orders), len(order_items)
+
+
+def _init_worker(generator: CafeMockGenerator) -> None:
+    global _worker_generator
+    _worker_generator = generator
+
+
+def _run_chunk(task: str, dates: List[datetime]) -> Any:
+    return getattr(_worker_generator, task)(dates)
+
+
+# チェーンモードのワーカーごとに保持する (チェーン, 開始日, 終了日, 出力先, 形式, NDJSON, 圧縮形式, コンパクト JSON)
+_worker_chain_task: Optional[Tuple] = None
+
+
+def _init_chain_worker(chain: CafeChainGenerator, *args: Any) -> None:
+    global _worker_chain_task
+    _worker_chain_task = (chain, *args)
+
+
+def _run_store(store: StoreProfile) -> Tuple[int, int]:
+    chain, *args = _worker_chain_task
+    return chain._save_store(store, *args)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="カフェ売上モックデータジェネレーター")
+    parser.add_argument("--config", default="config.yaml", help="設定ファイルのパス")
+    parser.add_argument("--year", type=int, help="生成する年（省略時は設定ファイルの値）")
+    parser.add_argument("--month", type=int, help="生成する月（省略時は設定ファイルの値）")
+    parser.add_argument("--start", type=_parse_date, help="期間指定で生成する開始日（YYYY-MM-DD、--end と併用）")
+    parser.add_argument("--end", type=_parse_date, help="期間指定で生成する終了日（YYYY-MM-DD、当日を含む）")
+    parser.add_argument(
+        "--formats",
+        type=lambda value: value.split(","),
+        help=(
+            f"出力形式（カンマ区切り: {','.join(OUTPUT_FORMATS)}。"
+            f"省略時は期間指定・チェーンで json,csv、月次で {','.join(MONTHLY_OUTPUT_FORMATS)}）"
+        ),
+    )
+    parser.add_argument("--ndjson", action="store_true", help="期間指定時に JSON を NDJSON（1行1レコード）で出力")
+    parser.add_argument(
+        "--compress",
+        choices=tuple(COMPRESSION_EXTENSIONS),
+        help="JSON / NDJSON / CSV を圧縮して出力（拡張子 .gz / .bz2 / .xz / .zst を付ける。zstd は zstandard が必要）",
+    )
+    parser.add_argument("--compact-json", action="store_true", help="JSON を改行・インデントなしで出力")
+    parser.add_argument("--engine", choices=CafeMockGenerator.ENGINES, default="python", help="生成エンジン")
+    parser.add_argument("--seed", type=int, help="マスターシード（指定すると出力が再現可能になる）")
+    parser.add_argument("--workers", type=int, default=1, help="並列に生成するプロセス数")
+    parser.add_argument("--stores", help="チェーンモードの店舗プロファイル（YAML）。指定すると店舗ごとに出力する")
+    parser.add_argument("--store-count", type=int, help="店舗プロファイルを複製して生成する店舗数（--stores と併用）")
+    parser.add_argument(
+        "--replay",
+        metavar="TARGET",
+        help="注文を時刻順に NDJSON で送出するリプレイモード（-: 標準出力、tcp://host:port、unix:///path）",
+    )
+    parser.add_argument("--speed", type=float, default=1.0, help="リプレイの速度倍率（0 以下で待たずに最大速度）")
+    parser.add_argument(
+        "--shard",
+        type=_parse_shard,
+        metavar="I/N",
+        help="期間を N 個に分けた I 番目（1始まり）だけを生成し、マニフェストと共に保存（--seed が必要）",
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="+",
+        metavar="SHARD_DIR",
+        help="--shard で生成したシャード（またはそれらを含むディレクトリ）を結合する",
+    )
+    parser.add_argument("--progress", action="store_true", help="生成の進捗・件数・残り時間の見積もりを標準エラーに表示")
+    parser.add_argument("--metrics", metavar="PATH", help="工程ごとの時間・件数・出力バイト数の JSON レポートの出力先")
+    parser.add_argument(
+        "--output-dir", help="シャードの出力先（省略時は shards_<期間>）、または結合結果の出力先（省略時はカレント）"
+    )
+    args = parser.parse_args(argv)
+    if args.store_count is not None and args.stores is None:
+        parser.error("--store-count は --stores と併用してください")
+    if (args.start is None) != (args.end is None):
+        parser.error("--start と --end は両方指定してください")
+    if args.shard is not None:
+        if args.seed is None:
+            parser.error("--shard には --seed の指定が必要です")
+        if args.stores is not None or args.replay is not None:
+            parser.error("--shard は --stores / --replay と併用できません")
+    if args.merge is not None and (args.shard is not None or args.stores is not None or args.replay is not None):
+        parser.error("--merge は --shard / --stores / --replay と併用できません")
+    if (args.progress or args.metrics) and (args.stores or args.replay or args.merge):
+        parser.error("--progress / --metrics は --stores / --replay / --merge と併用できません")
+    return args
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def _parse_shard(value: str) -> Tuple[int, int]:
+    """"I/N" 形式のシャード指定を解析"""
+    index, _, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"シャードは I/N の形式で指定してください: {value}") from None
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"シャード番号は 1〜N で指定してください: {value}")
+    return index, count
+
+
+def run_chain(args: argparse.Namespace) -> None:
+    """チェーンモード: 店舗プロファイルごとに期間（省略時は設定ファイルの年月）のデータを生成"""
+    stores = load_store_profiles(args.stores)
+    if args.store_count is not None:
+        stores = expand_store_profiles(stores, args.store_count)
+    chain = CafeChainGenerator(args.config, stores, engine=args.engine, seed=args.seed)
+    start, end = _resolve_period(args)
+    chain.generate_range_data(
+        start,
+        end,
+        workers=args.workers,
+        formats=args.formats,
+        json_lines=args.ndjson,
+        compression=args.compress,
+        compact_json=args.compact_json,
+    )
+
+
+def print_progress(snapshot: Dict[str, Any]) -> None:
+    """RunMetrics のコールバック: 進捗を1行で標準エラーに表示"""
+    eta = snapshot["eta_seconds"]
+    print(
+        f"{snapshot['days_done']}/{snapshot['days_total']} 日"
+        f"  注文 {snapshot['orders']} 件  注文アイテム {snapshot['order_items']} 件"
+        f"  出力 {snapshot['bytes_written'] / (1 << 20):.1f} MiB"
+        f"  経過 {snapshot['elapsed_seconds']:.1f} 秒  残り {'-' if eta is None else f'{eta:.1f} 秒'}",
+        file=sys.stderr,
+    )
+
+
+def run_shard(args: argparse.Namespace, metrics: Optional[RunMetrics] = None) -> None:
+    """シャードモード: 期間（省略時は設定ファイルの年月）を分割した1つ分だけを生成"""
+    generator = CafeMockGenerator(args.config, engine=args.engine, seed=args.seed, metrics=metrics)
+    start, end = _resolve_period(args)
+    index, count = args.shard
+    manifest = generator.save_shard(
+        start,
+        end,
+        index,
+        count,
+        workers=args.workers,
+        formats=args.formats,
+        json_lines=args.ndjson,
+        output_dir=args.output_dir,
+        compression=args.compress,
+        compact_json=args.compact_json,
+    )
+    print(
+        f"シャード {index}/{count}（{manifest.shard_start}〜{manifest.shard_end}）の"
+        f"注文 {manifest.orders} 件、注文アイテム {manifest.order_items} 件を出力しました。"
+    )
+
+
+def run_merge(args: argparse.Namespace) -> None:
+    """マージモード: シャードの出力を結合して、期間全体を1回で生成した場合と同じファイルを書き出す"""
+    manifest = merge_shards(args.merge, args.output_dir or ".")
+    print(
+        f"{manifest.start}〜{manifest.end} のシャードを結合し、"
+        f"注文 {manifest.orders} 件、注文アイテム {manifest.order_items} 件を出力しました。"
+    )
+
+
+def run_replay(args: argparse.Namespace) -> None:
+    """リプレイモード: 期間（省略時は設定ファイルの年月）の注文を時刻順に送出（進捗は標準エラーへ）"""
+    import asyncio
+
+    generator = CafeMockGenerator(args.config, engine=args.engine, seed=args.seed)
+    start, end = _resolve_period(args)
+    replayer = OrderReplayer(generator, start, end, speed=args.speed, workers=args.workers)
+    print(f"{start:%Y-%m-%d}〜{end:%Y-%m-%d} の注文を {args.speed} 倍速で送出します...", file=sys.stderr)
+    try:
+        sent = asyncio.run(replayer.to_target(args.replay))
+    except (BrokenPipeError, ConnectionResetError):
+        # 送出先（head などのパイプや接続先）が先に閉じた場合は途中で終了する
+        print("送出先が切断されたため終了します。", file=sys.stderr)
+        return
+    print(f"注文 {sent} 件を送出しました。", file=sys.stderr)
+
+
+def _resolve_period(args: argparse.Namespace) -> Tuple[datetime, datetime]:
+    """--start / --end、なければ --year / --month（省略時は設定ファイルの年月）の1ヶ月を期間にする"""
+    if args.start is not None:
+        return args.start, args.end
+    period = load_config(args.config).get("generate_period", {})
+    year, month = args.year or period.get("year", 2024), args.month or period.get("month", 4)
+    start = datetime(year, month, 1)
+    return start, datetime(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+
+
+def main(argv: Optional[List[str]] = None):
     """メイン実行関数"""
+    args = parse_args(argv)
+    if args.formats is None and (args.start is not None or args.stores is not None or args.shard is not None):
+        args.formats = ["json", "csv"]
+    if args.replay is not None:
+        # 標準出力を送出先に使えるよう、メッセージは出さない
+        run_replay(args)
+        return
+    metrics = None
+    if args.progress or args.metrics:
+        metrics = RunMetrics(callback=print_progress if args.progress else None)
     try:
         print("カフェ売上データジェネレーターを開始します...")
-        generator = CafeMockGenerator()
+        if args.merge is not None:
+            run_merge(args)
+            return
+        if args.shard is not None:
+            run_shard(args, metrics)
+            return
+        if args.stores is not None:
+            run_chain(args)
+            return
+        generator = CafeMockGenerator(args.config, engine=args.engine, seed=args.seed, metrics=metrics)
+        if args.start is not None:
+            generator.generate_range_data(
+                args.start,
+                args.end,
+                workers=args.workers,
+                formats=args.formats,
+                json_lines=args.ndjson,
+                compression=args.compress,
+                compact_json=args.compact_json,
+            )
+            return
         generator.generate_test_data(
-            year=generator.generate_test_year,
-            month=generator.generate_test_month,
+            year=args.year or generator.generate_year,
+            month=args.month or generator.generate_month,
+            workers=args.workers,
+            formats=args.formats or MONTHLY_OUTPUT_FORMATS,
+            compression=args.compress,
+            compact_json=args.compact_json,
         )
         print("データ生成が完了しました。")
     except Exception as e:
         print(f"エラーが発生しました: {str(e)}")
         raise
+    finally:
+        if metrics is not None:
+            metrics.finish()
+            if args.metrics:
+                metrics.save(args.metrics)
 
 
 if __name__ == "__main__":
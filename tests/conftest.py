@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(autouse=True)
+def _no_config_cache(monkeypatch):
+    # テストでは ~/.cache に設定のキャッシュを書かない
+    monkeypatch.setenv("CAFE_MOCK_CONFIG_CACHE", "0")
+
+
+@pytest.fixture
+def config_path() -> str:
+    return str(ROOT / "config.yaml")
@@ -0,0 +1,349 @@
+"""生成結果の再現性・エンジン間の分布・シャードの結合・ライターの出力の回帰テスト"""
+
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pytest
+import yaml
+
+import cafe_sales_mock_generator as cafe
+
+START, END = datetime(2024, 1, 25), datetime(2024, 3, 5)
+
+
+def _read_outputs(directory: Path) -> dict:
+    """ディレクトリ内のファイル（サブディレクトリを含む）を相対パス -> バイト列で読む"""
+    return {
+        str(path.relative_to(directory)): path.read_bytes()
+        for path in sorted(directory.rglob("*"))
+        if path.is_file() and path.name != cafe.SHARD_MANIFEST
+    }
+
+
+@pytest.mark.parametrize("engine", cafe.CafeMockGenerator.ENGINES)
+def test_output_is_identical_across_workers(tmp_path, config_path, engine):
+    outputs = []
+    for workers in (1, 3):
+        generator = cafe.CafeMockGenerator(config_path, engine=engine, seed=11)
+        output_dir = tmp_path / f"workers{workers}"
+        output_dir.mkdir()
+        generator.save_range(START, END, workers, ("json", "csv", "summary"), output_dir=str(output_dir))
+        outputs.append(_read_outputs(output_dir))
+    assert outputs[0] == outputs[1]
+
+
+def test_engines_have_matching_distributions(config_path):
+    stats = {}
+    for engine in cafe.CafeMockGenerator.ENGINES:
+        generator = cafe.CafeMockGenerator(config_path, engine=engine, seed=3)
+        orders, order_items = generator.generate_range_orders(datetime(2023, 1, 1), datetime(2024, 12, 31))
+        stats[engine] = {
+            "orders_per_day": len(orders) / 731,
+            "takeout_rate": float(np.mean(orders.order_type_id == cafe.OrderType.TAKEOUT.value)),
+            "items_per_order": len(order_items) / len(orders),
+            "mean_total_price": float(orders.total_price.mean()),
+            "slot_shares": np.bincount(orders.time_slot_id, minlength=len(cafe.TimeSlot) + 1)[1:] / len(orders),
+            "item_shares": np.bincount(order_items.menu_item_id, minlength=40) / len(order_items),
+        }
+    python, numpy = stats["python"], stats["numpy"]
+    assert numpy["orders_per_day"] == pytest.approx(python["orders_per_day"], rel=0.08)
+    assert numpy["takeout_rate"] == pytest.approx(python["takeout_rate"], rel=0.1)
+    assert numpy["items_per_order"] == pytest.approx(python["items_per_order"], rel=0.03)
+    assert numpy["mean_total_price"] == pytest.approx(python["mean_total_price"], rel=0.03)
+    np.testing.assert_allclose(numpy["slot_shares"], python["slot_shares"], atol=0.03)
+    np.testing.assert_allclose(numpy["item_shares"], python["item_shares"], atol=0.01)
+
+
+@pytest.mark.parametrize(
+    "engine, formats, options",
+    [
+        ("python", ("json", "csv", "summary"), {}),
+        ("numpy", ("json", "csv"), {"json_lines": True}),
+        ("numpy", ("json", "csv"), {"compression": "gzip", "compact_json": True}),
+        ("numpy", ("sqlite",), {}),
+    ],
+)
+def test_merged_shards_match_single_run(tmp_path, config_path, engine, formats, options):
+    generator = cafe.CafeMockGenerator(config_path, engine=engine, seed=5)
+    single = tmp_path / "single"
+    single.mkdir()
+    generator.save_range(START, END, formats=formats, output_dir=str(single), **options)
+
+    for index in (1, 2, 3):
+        generator.save_shard(START, END, index, 3, formats=formats, output_dir=str(tmp_path / "shards"), **options)
+    merged = cafe.merge_shards([str(tmp_path / "shards")], str(tmp_path / "merged"))
+
+    assert merged.orders > 0
+    single_outputs, merged_outputs = _read_outputs(single), _read_outputs(tmp_path / "merged")
+    if "sqlite" in formats:
+        # SQLite はページ配置が異なりうるため、内容で比べる
+        [name] = [name for name in single_outputs if name.endswith(".sqlite")]
+        dumps = [list(sqlite3.connect(directory / name).iterdump()) for directory in (single, tmp_path / "merged")]
+        assert dumps[0] == dumps[1]
+        del single_outputs[name], merged_outputs[name]
+    assert merged_outputs == single_outputs
+
+
+def _sample_records():
+    return [
+        {"id": "20240101-001", "name": "ブレンドコーヒー", "price": 450, "tags": ["hot", "set"]},
+        {"id": "20240101-002", "name": 'quote " and \\ backslash', "price": 0, "tags": []},
+    ]
+
+
+@pytest.mark.parametrize("records", [[], _sample_records()])
+def test_json_array_writer_matches_json_dump(tmp_path, records):
+    with cafe.JsonArrayWriter(tmp_path / "indent.json") as writer:
+        # バッチの区切りに依らず同じ出力になる
+        writer.write(records[:1])
+        writer.write(records[1:])
+    with cafe.JsonArrayWriter(tmp_path / "compact.json", indent=None) as writer:
+        writer.write(records)
+
+    assert (tmp_path / "indent.json").read_text(encoding="utf-8") == json.dumps(records, ensure_ascii=False, indent=2)
+    assert (tmp_path / "compact.json").read_text(encoding="utf-8") == json.dumps(
+        records, ensure_ascii=False, separators=(",", ":")
+    )
+
+
+def test_ndjson_writer_writes_one_record_per_line(tmp_path):
+    records = _sample_records()
+    with cafe.NdjsonWriter(tmp_path / "records.ndjson") as writer:
+        writer.write(records)
+    lines = (tmp_path / "records.ndjson").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == records
+
+
+def test_compressed_output_does_not_depend_on_write_sizes(tmp_path):
+    data = bytes(range(256)) * 200
+    for name, step in (("small.gz", 7), ("large.gz", 5000)):
+        with cafe.ParallelCompressedFile(str(tmp_path / name), "gzip", chunk_size=4096) as f:
+            for start in range(0, len(data), step):
+                f.write(data[start : start + step])
+    assert (tmp_path / "small.gz").read_bytes() == (tmp_path / "large.gz").read_bytes()
+    assert gzip.decompress((tmp_path / "small.gz").read_bytes()) == data
+
+
+def test_database_sink_loads_with_foreign_keys_enforced(config_path):
+    generator = cafe.CafeMockGenerator(config_path, engine="numpy", seed=2)
+    connection = sqlite3.connect(":memory:")
+    connection.execute("PRAGMA foreign_keys = ON")
+    with cafe.DatabaseSink(connection, generator.build_master_data()) as sink:
+        for orders, order_items in generator.iter_column_batches(START, END):
+            sink.write(orders, order_items)
+    assert connection.execute("PRAGMA foreign_key_check").fetchall() == []
+    assert connection.execute("SELECT COUNT(*) FROM order_items").fetchone()[0] > 0
+
+
+def test_sqlite_sink_removes_file_on_failure(tmp_path, config_path):
+    generator = cafe.CafeMockGenerator(config_path, engine="numpy", seed=2)
+    path = tmp_path / "cafe.sqlite"
+    with pytest.raises(RuntimeError):
+        with cafe.DatabaseSink.sqlite(path, generator.build_master_data(), commit_rows=10) as sink:
+            for orders, order_items in generator.iter_column_batches(START, END):
+                sink.write(orders, order_items)
+            raise RuntimeError("中断")
+    assert not path.exists()
+
+
+def test_store_can_drop_items_used_in_slot_popularity(config_path):
+    store = cafe.StoreProfile(2, "支店", menu_overrides=[{"id": 13, "available": False}])
+    for engine in cafe.CafeMockGenerator.ENGINES:
+        generator = cafe.CafeMockGenerator(config_path, engine=engine, seed=1, store=store)
+        _, order_items = generator.generate_range_orders(START, END)
+        assert 13 not in set(order_items.menu_item_id.tolist())
+
+
+def _write_config(tmp_path: Path, config_path: str, **overrides) -> str:
+    """基本設定の一部を差し替えた設定ファイルを書き出す"""
+    with open(config_path, encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    config.update(overrides)
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump(config, allow_unicode=True), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("engine", cafe.CafeMockGenerator.ENGINES)
+def test_calendar_scales_orders_by_weekday_demand(tmp_path, config_path, engine):
+    weekday_factors = [1.0, 1.0, 1.0, 1.0, 1.0, 1.3, 1.0]
+    calendar_path = _write_config(tmp_path, config_path, calendar={"weekday_factors": weekday_factors})
+    generator = cafe.CafeMockGenerator(calendar_path, engine=engine, seed=7)
+    orders, _ = generator.generate_range_orders(datetime(2023, 1, 1), datetime(2024, 12, 31))
+
+    # 1970-01-01 は木曜日。月曜日を 0 とする
+    weekdays = (orders.date.astype(np.int64) + 3) % 7
+    days = np.bincount((np.arange(np.datetime64("2023-01-01"), np.datetime64("2025-01-01")).astype(np.int64) + 3) % 7)
+    per_day = np.bincount(weekdays, minlength=7) / days
+    assert per_day[5] / per_day[0] == pytest.approx(1.3, rel=0.05)
+
+    # 上限（土曜日）の日はカレンダーなしと同じ注文数になる
+    plain, _ = cafe.CafeMockGenerator(config_path, engine=engine, seed=7).generate_range_orders(
+        datetime(2023, 1, 1), datetime(2024, 12, 31)
+    )
+    plain_per_day = np.bincount((plain.date.astype(np.int64) + 3) % 7, minlength=7) / days
+    assert per_day[5] == pytest.approx(plain_per_day[5], rel=0.05)
+
+
+def test_calendar_rejects_growth_above_ceiling(tmp_path, config_path):
+    calendar = {"annual_growth": 0.1, "trend_base": "2024-01-01", "demand_ceiling": 1.2}
+    generator = cafe.CafeMockGenerator(_write_config(tmp_path, config_path, calendar=calendar), seed=1)
+    generator.generate_range_orders(datetime(2024, 1, 1), datetime(2024, 1, 7))
+    with pytest.raises(ValueError, match="annual_growth"):
+        generator.generate_range_orders(datetime(2026, 1, 1), datetime(2026, 1, 7))
+
+
+def test_small_store_generates_in_both_engines(config_path):
+    store = cafe.StoreProfile(5, "小", customer_scale=0.1)
+    counts = {}
+    for engine in cafe.CafeMockGenerator.ENGINES:
+        generator = cafe.CafeMockGenerator(config_path, engine=engine, seed=4, store=store)
+        orders, _ = generator.generate_range_orders(datetime(2024, 1, 1), datetime(2024, 6, 30))
+        counts[engine] = len(orders)
+    assert counts["python"] > 0
+    assert counts["numpy"] == pytest.approx(counts["python"], rel=0.1)
+
+
+@pytest.mark.parametrize("scale", [0, -1.0])
+def test_store_rejects_non_positive_customer_scale(config_path, scale):
+    with pytest.raises(ValueError, match="customer_scale"):
+        cafe.CafeChainGenerator(config_path, [cafe.StoreProfile(1, "本店", customer_scale=scale)], seed=1)
+
+
+def test_chain_order_ids_are_unique_across_stores(tmp_path, config_path):
+    stores = cafe.load_store_profiles(str(Path(config_path).parent / "stores.yaml"))
+    chain = cafe.CafeChainGenerator(config_path, stores, engine="numpy", seed=8)
+    chain.generate_range_data(START, END, formats=("json",), output_dir=str(tmp_path))
+
+    order_ids, item_order_ids = [], set()
+    for store in stores:
+        store_dir = tmp_path / f"store={store.id:04d}"
+        orders = json.loads(next(store_dir.glob("orders_*.json")).read_text(encoding="utf-8"))
+        items = json.loads(next(store_dir.glob("order_items_*.json")).read_text(encoding="utf-8"))
+        order_ids += [order["id"] for order in orders]
+        item_order_ids |= {item["order_id"] for item in items}
+    assert len(order_ids) == len(set(order_ids))
+    assert item_order_ids <= set(order_ids)
+
+
+@pytest.mark.parametrize("file_format", cafe.COLUMNAR_FORMATS)
+def test_columnar_output_round_trips(tmp_path, config_path, file_format):
+    ds = pytest.importorskip("pyarrow.dataset")
+    generator = cafe.CafeMockGenerator(config_path, engine="numpy", seed=6)
+    generator.save_range(START, END, formats=(file_format,), output_dir=str(tmp_path))
+    orders, order_items = generator.generate_range_orders(START, END)
+
+    root = next(tmp_path.glob(f"{file_format}_*"))
+    table = ds.dataset(root / "orders", format=file_format).to_table().sort_by("id")
+    assert table.column("id").to_pylist() == sorted(orders.ids())
+    order = np.argsort(np.array(orders.ids()))
+    for name in ("gender_id", "time_slot_id", "total_price"):
+        assert table.column(name).to_numpy().tolist() == getattr(orders, name)[order].tolist()
+    # Arrow はカテゴリ型のまま、Parquet は int32 として読み戻される
+    assert str(table.schema.field("weather_id").type).startswith("dictionary") == (file_format == "arrow")
+    assert ds.dataset(root / "order_items", format=file_format).count_rows() == len(order_items)
+
+
+def test_replay_emits_all_orders_in_time_order(config_path):
+    generator = cafe.CafeMockGenerator(config_path, engine="numpy", seed=9)
+    orders, order_items = generator.generate_range_orders(START, END)
+    events = []
+    sent = asyncio.run(cafe.OrderReplayer(generator, START, END, speed=0).to_callback(events.append))
+
+    assert sent == len(events) == len(orders)
+    timestamps = [event["timestamp"] for event in events]
+    assert timestamps == sorted(timestamps)
+    assert sorted(event["id"] for event in events) == sorted(orders.ids())
+    assert sum(len(event["items"]) for event in events) == len(order_items)
+
+
+def test_replay_stops_generating_while_the_consumer_is_blocked(config_path):
+    generator = cafe.CafeMockGenerator(config_path, engine="numpy", seed=9)
+    iter_daily_sales = generator.iter_daily_sales
+    produced = []
+
+    def counting_iter(*args):
+        for day in iter_daily_sales(*args):
+            produced.append(f"{day[0]:%Y-%m-%d}")
+            yield day
+
+    generator.iter_daily_sales = counting_iter
+    ahead = []
+
+    async def slow_callback(event):
+        # 送出中の注文の日より先に生成済みの日数
+        ahead.append(sum(day > event["timestamp"][:10] for day in produced))
+        await asyncio.sleep(0.0005)
+
+    replayer = cafe.OrderReplayer(generator, START, END, speed=0, buffer_days=2, max_batch=1)
+    asyncio.run(replayer.to_callback(slow_callback))
+    # キュー（buffer_days）と、キューへの追加を待っている1日分を超えて先行しない
+    assert len(produced) == (END - START).days + 1
+    assert max(ahead) <= replayer.buffer_days + 1
+
+
+@pytest.fixture
+def config_cache(tmp_path, monkeypatch) -> Path:
+    monkeypatch.setenv("CAFE_MOCK_CONFIG_CACHE", "1")
+    monkeypatch.setenv("CAFE_MOCK_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+def test_config_cache_skips_yaml_parsing_on_hit(config_cache, monkeypatch, config_path):
+    config = cafe.load_config(config_path)
+    monkeypatch.setattr(yaml, "safe_load", lambda data: pytest.fail("キャッシュが使われていません"))
+    assert cafe.load_config(config_path) == config
+
+
+def test_config_cache_evicts_least_recently_used(tmp_path, config_cache):
+    paths = []
+    for i in range(cafe.CONFIG_CACHE_ENTRIES + 2):
+        path = tmp_path / f"config{i}.yaml"
+        path.write_text(f"value: {i}\n", encoding="utf-8")
+        paths.append(path)
+        cafe.load_config(str(path))
+        # 書き込み順がそのまま使用順になるよう、更新日時を1秒ずつずらす
+        [cached] = config_cache.glob(f"{cafe.config_digest(str(path))}.*")
+        os.utime(cached, (i + 1, i + 1))
+        if i == 5:
+            # 最初の設定を使い直すと、後から書き込んだ設定より後まで残る
+            cafe.load_config(str(paths[0]))
+
+    remaining = {path.name.split(".")[0] for path in config_cache.glob("*.pickle")}
+    assert len(remaining) == cafe.CONFIG_CACHE_ENTRIES
+    assert cafe.config_digest(str(paths[0])) in remaining
+    assert not {cafe.config_digest(str(path)) for path in paths[1:3]} & remaining
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_metrics_report_progress_without_changing_output(tmp_path, config_path, workers):
+    snapshots = []
+    metrics = cafe.RunMetrics(callback=snapshots.append, interval=0)
+    generator = cafe.CafeMockGenerator(config_path, engine="numpy", seed=12, metrics=metrics)
+    measured, plain = tmp_path / "measured", tmp_path / "plain"
+    measured.mkdir()
+    plain.mkdir()
+    order_count, item_count = generator.save_range(START, END, workers, ("json", "csv"), output_dir=str(measured))
+    cafe.CafeMockGenerator(config_path, engine="numpy", seed=12).save_range(
+        START, END, workers, ("json", "csv"), output_dir=str(plain)
+    )
+    assert _read_outputs(measured) == _read_outputs(plain)
+
+    metrics.finish()
+    final = snapshots[-1]
+    assert final["days_done"] == final["days_total"] == (END - START).days + 1
+    assert (final["orders"], final["order_items"]) == (order_count, item_count)
+    assert final["eta_seconds"] == 0
+    assert final["bytes_written"] == sum(len(data) for data in _read_outputs(measured).values())
+    assert {"generate", "json", "csv"} <= set(final["stages"])
+    assert [snapshot["days_done"] for snapshot in snapshots] == sorted(snapshot["days_done"] for snapshot in snapshots)
+
+    metrics.save(str(tmp_path / "metrics.json"))
+    report = json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))
+    assert report["orders"] == order_count